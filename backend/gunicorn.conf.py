@@ -0,0 +1,45 @@
+"""
+KrishiSahay gunicorn config
+Multi-worker serving with the embedding model and FAISS indexes loaded once in the
+master (preload_app) and shared copy-on-write by the uvicorn workers
+
+    gunicorn main:app -c gunicorn.conf.py
+
+Prebuild the index artifacts first (python -m utils.index_store) so the master only
+memory-maps them instead of encoding the KB before forking.
+"""
+
+import os
+import glob
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+# Workers keep their stage histograms here so /metrics reports all of them (utils/metrics.py).
+# Set before the app is imported, which preload_app does right after reading this file.
+os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), f"krishisahay-metrics-{os.getenv('PORT', '8000')}"))
+
+
+def on_starting(server):
+    # A new server starts its counters from zero (Prometheus treats that as a reset)
+    for path in glob.glob(os.path.join(os.environ["METRICS_DIR"], "stages_*.json")):
+        os.remove(path)
+
+
+def when_ready(server):
+    # Runs in the master after main:app is imported and before any worker is forked
+    import main
+    from utils.serving import freeze_shared
+    main.preload(rag_engine=True)
+    freeze_shared()
+
+
+def post_fork(server, worker):
+    from utils.serving import configure_worker
+    configure_worker(workers)
@@ -4,11 +4,11 @@ FastAPI Backend with RAG Pipeline
 """
 
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Optional
-import json, os, hashlib, time
+from typing import Optional, Union
+import asyncio, json, os, time
 
 try:
     from dotenv import load_dotenv
@@ -16,28 +16,78 @@ try:
 except ImportError:
     pass
 
+from utils.concurrency import AdmissionController, Overloaded, shutdown_cpu_executor
+from utils.batch_embedder import BatchingEmbedder
+from utils.lexical_index import BM25Index
+from utils.chunking import pack_context
+from utils.language import detect_language
+from utils.catalog import CatalogHolder, json_response
+from utils.warmup import get_warmup, warm_encoder
+from utils.metrics import span, render_prometheus, ServerTimingMiddleware, SERVER_TIMING
+from utils.database import init_db, prime_query_ids, close_writer, asave_query, save_feedback, retention_loop, get_stats as get_usage_stats
+
 try:
-    from sentence_transformers import SentenceTransformer
     import faiss
     import numpy as np
+    from utils.embeddings import get_model, encode, backend_available, EMBEDDING_BACKEND
+    from utils.index_store import load_index
+    from utils.ann import index_spec_from_env
+    if not backend_available():
+        raise ImportError(f"no runtime for EMBEDDING_BACKEND={EMBEDDING_BACKEND}")
     FAISS_AVAILABLE = True
 except ImportError:
     FAISS_AVAILABLE = False
     print("FAISS not available - using keyword search")
 
 try:
-    import requests
-    REQUESTS_AVAILABLE = True
+    from utils.llm_client import watson_generate, start_http_client, close_http_client
+    LLM_CLIENT_AVAILABLE = True
 except ImportError:
-    REQUESTS_AVAILABLE = False
+    LLM_CLIENT_AVAILABLE = False
+
+try:
+    from routers import health as health_router, query as query_router, feedback as feedback_router, schemes as schemes_router, admin as admin_router, stats as stats_router
+    from utils.rag_engine import kb_sync_loop, preload_rag_engine, get_rag_engine
+    from utils.translator import shutdown_translation_executor
+    ROUTERS_AVAILABLE = True
+except ImportError as e:
+    ROUTERS_AVAILABLE = False
+    print(f"RAG API routers not available: {e}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    build_faiss_index()
+    if not preloaded:
+        catalog.reload(KNOWLEDGE_BASE, SCHEMES)
+        build_keyword_index()
+    init_db()
+    prime_query_ids()
+    start_warmup()
+    retention = asyncio.create_task(retention_loop())
+    kb_sync = None
+    if ROUTERS_AVAILABLE:
+        kb_sync = asyncio.create_task(kb_sync_loop())
+    if LLM_CLIENT_AVAILABLE:
+        await start_http_client()
     yield
+    retention.cancel()
+    if kb_sync:
+        kb_sync.cancel()
+    if ROUTERS_AVAILABLE:
+        shutdown_translation_executor()
+    close_writer()
+    await search_batcher.close()
+    if LLM_CLIENT_AVAILABLE:
+        await close_http_client()
+    shutdown_cpu_executor()
 
 app = FastAPI(title="KrishiSahay API", version="1.0.0", lifespan=lifespan)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
+if SERVER_TIMING: app.add_middleware(ServerTimingMiddleware)
+
+# Multilingual RAG pipeline (utils/) served under /api, which nginx proxies
+if ROUTERS_AVAILABLE:
+    for r in (health_router, query_router, feedback_router, schemes_router, admin_router, stats_router):
+        app.include_router(r.router, prefix="/api")
 
 KNOWLEDGE_BASE = [
     {"id":"kb_001","category":"crops","question":"Best crops for summer season?","answer":"For summer: Maize (25-35°C), Moong dal (60-75 days), Sunflower, Groundnut (drought-tolerant), Sesame, Cucumber/bitter gourd/ridge gourd. Ensure adequate irrigation.","keywords":["summer","crops","season","kharif","hot"],"tags":["crops","seasons"]},
@@ -68,98 +118,123 @@ SCHEMES = [
     {"name":"RKVY","benefit":"Agriculture Development Fund","category":"Development","url":"rkvy.nic.in","color":"#dc2626"},
 ]
 
+# Precomputed /kb, /categories and /schemes responses; reload() swaps in a new snapshot
+catalog = CatalogHolder()
+
+KB_INDEX_NAME = "kb"
+
 faiss_index = None
 index_items = []
 embedder = None
 
+def kb_text(item):
+    return f"{item['question']} {item['answer']}"
+
+def kb_index_spec():
+    """Exact scan over the small KB, stored as FAISS_STORAGE says"""
+    return {**index_spec_from_env(), "type": "flat"}
+
 def build_faiss_index():
     global faiss_index, index_items, embedder
     if not FAISS_AVAILABLE:
         return
     try:
-        embedder = SentenceTransformer('all-MiniLM-L6-v2')
-        texts = [f"{i['question']} {i['answer']}" for i in KNOWLEDGE_BASE]
-        embs = embedder.encode(texts).astype(np.float32)
-        faiss.normalize_L2(embs)
-        faiss_index = faiss.IndexFlatIP(embs.shape[1])
-        faiss_index.add(embs)
+        embedder = get_model()
+        index, _ = load_index(KB_INDEX_NAME, KNOWLEDGE_BASE, kb_text, kb_index_spec())
+        # May run on the warm-up thread while /search is served: publish the index last
         index_items = KNOWLEDGE_BASE
-        print(f"FAISS index built: {len(KNOWLEDGE_BASE)} items")
+        faiss_index = index
+        print(f"FAISS index ready: {len(KNOWLEDGE_BASE)} items")
     except Exception as e:
         print(f"FAISS build failed: {e}")
 
+keyword_index = None
+
+def build_keyword_index():
+    """Rebuild the BM25 inverted index; call whenever KNOWLEDGE_BASE changes"""
+    global keyword_index
+    keyword_index = BM25Index(KNOWLEDGE_BASE, kb_text, lambda item: item['keywords'])
+
 def keyword_search(query, top_k=3):
-    qwords = set(query.lower().split())
-    scores = []
-    for item in KNOWLEDGE_BASE:
-        score = 0
-        searchable = f"{item['question']} {item['answer']} {' '.join(item['keywords'])}".lower()
-        for w in qwords:
-            if len(w) > 2 and w in searchable:
-                score += 1
-            for kw in item['keywords']:
-                if w in kw.lower():
-                    score += 2
-        scores.append((score, item))
-    scores.sort(key=lambda x: x[0], reverse=True)
-    return [it for sc, it in scores[:top_k] if sc > 0]
+    if keyword_index is None:
+        build_keyword_index()
+    return [keyword_index.docs[idx] for sc, idx in keyword_index.search(query, top_k)]
 
-def semantic_search(query, top_k=3):
+def semantic_search_batch(queries, top_ks):
+    """One encode + one FAISS search for a batch of queries; keyword fallback per query"""
     if faiss_index is None or embedder is None:
-        return keyword_search(query, top_k)
+        return [keyword_search(q, k) for q, k in zip(queries, top_ks)]
     try:
-        qvec = embedder.encode([query]).astype(np.float32)
-        faiss.normalize_L2(qvec)
-        scores, indices = faiss_index.search(qvec, top_k)
-        results = [index_items[idx] for i, idx in enumerate(indices[0]) if idx >= 0 and scores[0][i] > 0.15]
-        return results if results else keyword_search(query, top_k)
+        with span("embed"): qvecs = encode(queries)
+        with span("faiss_search"): scores, indices = faiss_index.search(qvecs, max(top_ks))
+        out = []
+        for row, (q, k) in enumerate(zip(queries, top_ks)):
+            results = [index_items[idx] for i, idx in enumerate(indices[row][:k]) if idx >= 0 and scores[row][i] > 0.15]
+            out.append(results if results else keyword_search(q, k))
+        return out
     except:
-        return keyword_search(query, top_k)
+        return [keyword_search(q, k) for q, k in zip(queries, top_ks)]
 
-def generate_answer(query, context_items):
+def semantic_search(query, top_k=3):
+    return semantic_search_batch([query], [top_k])[0]
+
+search_batcher = BatchingEmbedder(semantic_search_batch, name="kb_search")
+
+preloaded = False
+
+def preload(rag_engine=False):
+    """Load the read-only state (catalog, BM25, FAISS, optionally the RAG engine); under gunicorn
+    this runs once in the master so forked workers share it copy-on-write"""
+    global preloaded
+    catalog.reload(KNOWLEDGE_BASE, SCHEMES)
+    build_keyword_index()
+    build_faiss_index()
+    if rag_engine and ROUTERS_AVAILABLE:
+        preload_rag_engine()
+    preloaded = True
+
+def start_warmup():
+    """Load whatever preload() didn't on a background thread; until it's done /search falls
+    back to BM25, /api/query waits for the RAG engine and /api/health/ready returns 503"""
+    warmup = get_warmup()
+    if FAISS_AVAILABLE and faiss_index is None:
+        warmup.add("kb_index", build_faiss_index)
+    if ROUTERS_AVAILABLE:
+        warmup.add("rag_engine", get_rag_engine)
+    if FAISS_AVAILABLE:
+        warmup.add("encoder", warm_encoder)
+    warmup.start()
+
+async def generate_answer(query, context_items):
     if not context_items:
         return {"answer":"I couldn't find specific information. Please call Kisan Call Center: 1800-180-1551 for expert advice.","sources":[],"method":"no_match"}
     
     IBM_KEY = os.getenv("IBM_API_KEY")
     IBM_PID = os.getenv("IBM_PROJECT_ID")
     
-    if IBM_KEY and IBM_PID and REQUESTS_AVAILABLE:
+    if IBM_KEY and IBM_PID and LLM_CLIENT_AVAILABLE:
         try:
-            ctx = "\n".join([f"Q: {i['question']}\nA: {i['answer']}" for i in context_items])
+            ctx = pack_context([{"title":i['question'],"content":i['answer']} for i in context_items])
             prompt = f"You are KrishiSahay, an agricultural assistant for Indian farmers.\nContext:\n{ctx}\n\nFarmer's question: {query}\n\nAnswer practically in 3-5 sentences:"
-            tr = requests.post("https://iam.cloud.ibm.com/identity/token",
-                data={"apikey":IBM_KEY,"grant_type":"urn:ibm:params:oauth:grant-type:apikey"},
-                headers={"Content-Type":"application/x-www-form-urlencoded"})
-            token = tr.json().get("access_token")
-            if token:
-                r = requests.post("https://us-south.ml.cloud.ibm.com/ml/v1/text/generation?version=2023-05-29",
-                    json={"model_id":"ibm/granite-13b-instruct-v2","input":prompt,"parameters":{"decoding_method":"greedy","max_new_tokens":400},"project_id":IBM_PID},
-                    headers={"Authorization":f"Bearer {token}","Content-Type":"application/json"})
-                ans = r.json().get("results",[{}])[0].get("generated_text","").strip()
-                if ans:
-                    return {"answer":ans,"sources":[i['id'] for i in context_items],"method":"ibm_watson"}
+            ans = await watson_generate(prompt, {"decoding_method":"greedy","max_new_tokens":400})
+            if ans:
+                return {"answer":ans,"sources":[i['id'] for i in context_items],"method":"ibm_watson"}
         except Exception as e:
             print(f"Watson error: {e}")
     
     return {"answer":context_items[0]['answer'],"sources":[i['id'] for i in context_items],"method":"knowledge_base"}
 
-def detect_language(text):
-    if any('\u0900' <= c <= '\u097F' for c in text): return 'hi'
-    if any('\u0C00' <= c <= '\u0C7F' for c in text): return 'te'
-    if any('\u0B80' <= c <= '\u0BFF' for c in text): return 'ta'
-    return 'en'
-
 class QueryRequest(BaseModel):
     query: str
     language: Optional[str] = "en"
     category: Optional[str] = None
 
 class FeedbackRequest(BaseModel):
-    query_id: str
-    rating: int
+    query_id: Union[int, str]
+    rating: int  # 1-5 from the frontend; stored as helpful (>=3) / not helpful
     comment: Optional[str] = None
 
-feedback_store = []
+query_admission = AdmissionController()
 
 # Startup is handled via the lifespan context manager above
 
@@ -169,59 +244,72 @@ def root():
 
 @app.get("/health")
 def health():
-    return {"status":"ok","faiss_available":FAISS_AVAILABLE,"faiss_loaded":faiss_index is not None,"kb_size":len(KNOWLEDGE_BASE),"ibm_configured":bool(os.getenv("IBM_API_KEY"))}
+    return {"status":"ok","faiss_available":FAISS_AVAILABLE,"faiss_loaded":faiss_index is not None,"kb_size":len(KNOWLEDGE_BASE),"ibm_configured":bool(os.getenv("IBM_API_KEY")),"queries":query_admission.stats(),"embedder":search_batcher.stats(),"ready":get_warmup().ready,"warmup":get_warmup().stats()}
+
+@app.get("/metrics")
+def metrics():
+    return Response(render_prometheus(), media_type="text/plain; version=0.0.4")
 
 @app.post("/query")
-def handle_query(req: QueryRequest):
+async def handle_query(req: QueryRequest):
     start = time.time()
     if not req.query.strip():
         raise HTTPException(400, "Query cannot be empty")
-    detected_lang = detect_language(req.query)
-    results = semantic_search(req.query, top_k=3)
-    if req.category and req.category != "all":
-        cat_r = [r for r in results if r.get('category') == req.category]
-        if cat_r: results = cat_r
-    response = generate_answer(req.query, results)
-    query_id = hashlib.md5(f"{req.query}{time.time()}".encode()).hexdigest()[:8]
+    try:
+        async with query_admission.admit():
+            detected_lang = detect_language(req.query)
+            with span("search"): results = await search_batcher.submit(req.query, 3)
+            if req.category and req.category != "all":
+                cat_r = [r for r in results if r.get('category') == req.category]
+                if cat_r: results = cat_r
+            response = await generate_answer(req.query, results)
+    except Overloaded:
+        raise HTTPException(503, "Server busy, please retry shortly", headers={"Retry-After":"2"})
+    elapsed = time.time()-start
+    query_id = await asave_query(req.query, detected_lang, response["answer"], response["sources"], int(elapsed*1000))
     return {
         "query_id": query_id, "query": req.query, "answer": response["answer"],
         "sources": response["sources"], "method": response["method"],
         "language": req.language, "detected_language": detected_lang,
         "related": [{"question":r["question"],"category":r["category"],"id":r["id"]} for r in results[:2]],
-        "processing_time": round(time.time()-start, 3),
+        "processing_time": round(elapsed, 3),
         "category": results[0]["category"] if results else "general"
     }
 
 @app.get("/schemes")
-def get_schemes():
-    return {"schemes":SCHEMES,"total":len(SCHEMES)}
+async def get_schemes(request: Request, category: Optional[str] = None):
+    return json_response(catalog.current.schemes_body(category), request)
 
 @app.get("/categories")
-def get_categories():
-    cats = {}
-    for i in KNOWLEDGE_BASE:
-        cats[i['category']] = cats.get(i['category'],0)+1
-    return {"categories":[{"name":k,"count":v} for k,v in cats.items()]}
+async def get_categories(request: Request):
+    return json_response(catalog.current.categories_body, request)
 
 @app.get("/kb/{item_id}")
-def get_kb_item(item_id: str):
-    for item in KNOWLEDGE_BASE:
-        if item['id'] == item_id: return item
-    raise HTTPException(404, "Not found")
+async def get_kb_item(item_id: str, request: Request):
+    entry = catalog.current.item_body(item_id)
+    if entry is None: raise HTTPException(404, "Not found")
+    return json_response(entry, request)
+
+# Search results only change with the KB, so nginx can micro-cache hot queries
+SEARCH_CACHE_CONTROL = f"public, max-age={int(os.getenv('SEARCH_MAX_AGE','60'))}"
+# Batched searches run with the largest limit among them, so one request mustn't inflate it
+SEARCH_LIMIT_MAX = 20
 
 @app.get("/search")
-def search_kb(q: str, limit: int = 5):
-    return {"query":q,"results":semantic_search(q, top_k=limit)}
+async def search_kb(q: str, response: Response, limit: int = 5):
+    response.headers["Cache-Control"] = SEARCH_CACHE_CONTROL
+    return {"query":q,"results":await search_batcher.submit(q, max(1, min(limit, SEARCH_LIMIT_MAX)))}
 
 @app.post("/feedback")
 def submit_feedback(req: FeedbackRequest):
-    feedback_store.append({"query_id":req.query_id,"rating":req.rating,"comment":req.comment,"timestamp":time.time()})
-    return {"status":"recorded","total":len(feedback_store)}
+    query_id = int(req.query_id) if str(req.query_id).isdigit() else None  # pre-SQLite ids were hex strings
+    save_feedback(query_id, 1 if req.rating >= 3 else -1, req.comment or "")
+    return {"status":"recorded"}
 
 @app.get("/stats")
 def get_stats():
-    ratings = [f["rating"] for f in feedback_store]
-    return {"kb_items":len(KNOWLEDGE_BASE),"schemes":len(SCHEMES),"feedback":len(feedback_store),"avg_rating":round(sum(ratings)/len(ratings),2) if ratings else 0,"faiss_enabled":FAISS_AVAILABLE and faiss_index is not None}
+    totals = (get_usage_stats("total") or [{}])[0]
+    return {"kb_items":len(KNOWLEDGE_BASE),"schemes":len(SCHEMES),"queries":totals.get("queries",0),"feedback":totals.get("feedback",0),"avg_feedback":totals.get("avg_feedback",0),"positive_rate":totals.get("positive_rate",0),"faiss_enabled":FAISS_AVAILABLE and faiss_index is not None}
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,101 @@
+"""Admin router — knowledge-base ingestion (requires X-Admin-Token)"""
+import os
+import hmac
+import json
+import logging
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+
+from utils.concurrency import run_ingest
+from utils.ingest import INGEST_BATCH_SIZE, ingest_batch, delete_documents, builtin_hashes
+from utils.rag_engine import get_loaded_rag_engine
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Longest NDJSON record accepted by /admin/ingest
+INGEST_MAX_LINE_BYTES = int(os.getenv("INGEST_MAX_LINE_BYTES", str(1024 * 1024)))
+
+
+def require_admin(x_admin_token: str = Header(default="")):
+    if not ADMIN_TOKEN or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+def _parse_line(line: bytes):
+    try:
+        return json.loads(line)
+    except ValueError:
+        logger.warning("Skipping malformed NDJSON line")
+        return None
+
+
+async def _ndjson_records(request: Request, max_line: int = INGEST_MAX_LINE_BYTES):
+    """
+    Parse an NDJSON request body incrementally, without buffering the whole upload.
+    Only the unfinished tail is kept between chunks, and a record longer than
+    max_line bytes fails the request with 413.
+    """
+    pending = bytearray()
+    async for chunk in request.stream():
+        start = 0
+        while True:
+            end = chunk.find(b"\n", start)
+            if end < 0:
+                break
+            if len(pending) + end - start > max_line:
+                raise HTTPException(status_code=413, detail=f"NDJSON record over {max_line} bytes")
+            pending += chunk[start:end]
+            if pending.strip():
+                record = _parse_line(pending)
+                if record is not None:
+                    yield record
+            pending.clear()
+            start = end + 1
+        pending += chunk[start:]
+        if len(pending) > max_line:
+            raise HTTPException(status_code=413, detail=f"NDJSON record over {max_line} bytes")
+    if pending.strip():
+        record = _parse_line(pending)
+        if record is not None:
+            yield record
+
+
+async def _sync_live():
+    engine = get_loaded_rag_engine()
+    if engine is not None and engine.initialized:
+        await run_ingest(engine.sync_live)
+
+
+@router.post("/admin/ingest", dependencies=[Depends(require_admin)])
+async def ingest(request: Request, batch_size: int = INGEST_BATCH_SIZE):
+    """Stream NDJSON documents into the KB; each batch is searchable as soon as it is written"""
+    totals = {"records": 0, "added": 0, "duplicates": 0, "invalid": 0}
+    skip = builtin_hashes()
+    batch_size = max(1, min(batch_size, 4096))
+    batch = []
+
+    async def flush():
+        stats = await run_ingest(ingest_batch, batch, skip)
+        for key in totals:
+            totals[key] += stats[key]
+        batch.clear()
+        await _sync_live()
+
+    async for record in _ndjson_records(request):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            await flush()
+    if batch:
+        await flush()
+
+    return {"success": True, **totals}
+
+
+@router.delete("/admin/kb/{doc_id}", dependencies=[Depends(require_admin)])
+async def delete_document(doc_id: str):
+    removed = await run_ingest(delete_documents, [doc_id])
+    if not removed:
+        raise HTTPException(status_code=404, detail="Document not found")
+    await _sync_live()
+    return {"success": True, "removed": removed}
@@ -1,7 +1,24 @@
 """Health check router"""
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
+from utils.llm_client import backend_stats
+from utils.translator import translation_stats
+from utils.database import writer_stats
+from utils.warmup import get_warmup
 router = APIRouter()
 
 @router.get("/health")
 async def health():
-    return {"status": "healthy", "service": "KrishiSahay API", "version": "1.0.0"}
+    return {"status": "healthy", "service": "KrishiSahay API", "version": "1.0.0", "llm_backends": backend_stats(), "translation": translation_stats(), "db_writer": writer_stats(), "ready": get_warmup().ready, "warmup": get_warmup().stats()}
+
+@router.get("/health/live")
+async def live():
+    """Liveness: the process is up and serving; restart only if this fails"""
+    return {"status": "alive"}
+
+@router.get("/health/ready")
+async def ready(response: Response):
+    """Readiness: 503 until the model and indexes are loaded and warm, so load balancers hold traffic"""
+    warmup = get_warmup()
+    if not warmup.ready:
+        response.status_code = 503
+    return {"ready": warmup.ready, **warmup.stats()}
@@ -1,25 +1,52 @@
 """Query Router — Main agricultural Q&A endpoint"""
 
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import Optional, List
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Dict, Optional, List
+import os
+import json
+import asyncio
 import logging
 import time
 
-from utils.rag_engine import get_rag_engine
-from utils.llm_client import generate_answer
-from utils.translator import detect_language, translate_to_english, translate_from_english, SUPPORTED_LANGUAGES
-from utils.database import save_query
+from utils.rag_engine import aget_rag_engine, BULK_RETRIEVE_CHUNK
+from utils.llm_client import generate_answer, stream_llm, rule_based_answer
+from utils.language import detect_language
+from utils.translator import (
+    translate_texts, translate_from_english, translate_to_english_checked, translate_from_english_checked,
+    SUPPORTED_LANGUAGES,
+)
+from utils.database import asave_query
+from utils.answer_cache import get_answer_cache
+from utils.catalog import to_json_body, json_response
+from utils.metrics import span
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+BATCH_QUERY_MAX = int(os.getenv("BATCH_QUERY_MAX", "5000"))
+BATCH_TOP_K_MAX = 20
+# LLM calls in flight per /query/batch request
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
+
 
 class QueryRequest(BaseModel):
     query: str
     language: Optional[str] = None  # Auto-detect if not provided
 
 
+class BatchQueryItem(BaseModel):
+    query: str
+    language: Optional[str] = None  # Auto-detect if not provided
+    id: Optional[str] = None  # Echoed back so callers can match results
+
+
+class BatchQueryRequest(BaseModel):
+    queries: List[BatchQueryItem]
+    top_k: int = Field(4, ge=1, le=BATCH_TOP_K_MAX)
+
+
 class Source(BaseModel):
     id: str
     title: str
@@ -48,45 +75,274 @@ async def process_query(request: QueryRequest):
         raise HTTPException(status_code=400, detail="Query too long (max 1000 characters)")
 
     # Detect language
-    detected_lang = request.language or await detect_language(request.query)
+    detected_lang = request.language or detect_language(request.query)
     logger.info(f"Query language: {detected_lang}")
 
-    # Translate to English for retrieval
-    english_query = request.query
-    if detected_lang != "en":
-        english_query = await translate_to_english(request.query, detected_lang)
-        logger.info(f"Translated query: {english_query}")
+    cache = get_answer_cache()
+    rag = await aget_rag_engine()
+    cache.ensure_version(rag.kb_version)
 
-    # RAG retrieval
-    rag = get_rag_engine()
-    context, source_docs = rag.get_context(english_query, top_k=4)
+    # Exact repeat of an earlier question — skip translation, retrieval and generation
+    cached = cache.get_exact(request.query, detected_lang)
 
-    # Generate answer in English
-    answer_en = await generate_answer(english_query, context)
+    if not cached:
+        # Translate to English for retrieval
+        english_query, query_translated = request.query, True
+        if detected_lang != "en":
+            english_query, query_translated = await translate_to_english_checked(request.query, detected_lang)
+            logger.info(f"Translated query: {english_query}")
 
-    # Translate answer back if needed
-    final_answer = answer_en
-    if detected_lang != "en":
-        final_answer = await translate_from_english(answer_en, detected_lang)
+        # RAG retrieval
+        with span("retrieve"):
+            query_embedding, source_docs = await rag.aretrieve_with_embedding(english_query, top_k=4)
+        if query_embedding is not None:
+            cached = cache.get_similar(query_embedding, detected_lang)
 
-    # Save to DB
-    sources_data = [
-        {"id": d["id"], "title": d["title"], "category": d["category"]}
-        for d in source_docs
-    ]
-    query_id = save_query(request.query, detected_lang, final_answer, sources_data)
+    if cached:
+        final_answer = cached["answer"]
+        sources_data = cached["sources"]
+    else:
+        context = rag.build_context(source_docs)
+
+        # Generate answer in English
+        answer = await generate_answer(english_query, context)
+
+        # Translate answer back if needed
+        final_answer, answer_translated = answer.text, True
+        if detected_lang != "en":
+            final_answer, answer_translated = await translate_from_english_checked(answer.text, detected_lang)
+
+        sources_data = [
+            {"id": d["id"], "title": d["title"], "category": d["category"]}
+            for d in source_docs
+        ]
+        # Rule-based fallbacks and partly untranslated answers aren't cached: they would
+        # be served for ANSWER_CACHE_TTL, also to similar questions, after the outage ends
+        if answer.from_llm and query_translated and answer_translated:
+            cache.put(request.query, detected_lang, query_embedding, final_answer, sources_data)
 
     processing_time = int((time.time() - start_time) * 1000)
 
+    # Save to DB
+    query_id = await asave_query(request.query, detected_lang, final_answer, sources_data, processing_time)
+
     return QueryResponse(
         answer=final_answer,
         sources=sources_data,
         detected_language=detected_lang,
         query_id=query_id,
-        processing_time_ms=processing_time
+        processing_time_ms=processing_time,
+        is_cached=cached is not None
     )
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/query/stream")
+async def stream_query(request: QueryRequest):
+    """
+    Server-Sent Events version of /query: a `sources` event first, then `token`
+    events as the LLM generates, then `done` with the query id. If generation breaks
+    off mid-answer the stream ends with an `error` event instead, and the partial
+    answer is neither cached nor logged.
+    """
+    start_time = time.time()
+
+    if not request.query or len(request.query.strip()) < 3:
+        raise HTTPException(status_code=400, detail="Query too short")
+
+    if len(request.query) > 1000:
+        raise HTTPException(status_code=400, detail="Query too long (max 1000 characters)")
+
+    detected_lang = request.language or detect_language(request.query)
+
+    async def events():
+        cache = get_answer_cache()
+        rag = await aget_rag_engine()
+        cache.ensure_version(rag.kb_version)
+
+        cached = cache.get_exact(request.query, detected_lang)
+        query_embedding = None
+        if not cached:
+            english_query, query_translated = request.query, True
+            if detected_lang != "en":
+                english_query, query_translated = await translate_to_english_checked(request.query, detected_lang)
+            with span("retrieve"):
+                query_embedding, source_docs = await rag.aretrieve_with_embedding(english_query, top_k=4)
+            if query_embedding is not None:
+                cached = cache.get_similar(query_embedding, detected_lang)
+
+        if cached:
+            sources_data = cached["sources"]
+            yield _sse("sources", {"sources": sources_data, "detected_language": detected_lang, "is_cached": True})
+            final_answer = cached["answer"]
+            yield _sse("token", {"text": final_answer})
+        else:
+            sources_data = [
+                {"id": d["id"], "title": d["title"], "category": d["category"]}
+                for d in source_docs
+            ]
+            yield _sse("sources", {"sources": sources_data, "detected_language": detected_lang, "is_cached": False})
+
+            # The LLM answers directly in the farmer's language so tokens can be forwarded as-is
+            context = rag.build_context(source_docs)
+            parts = []
+            try:
+                async for token in stream_llm(english_query, context, detected_lang):
+                    parts.append(token)
+                    yield _sse("token", {"text": token})
+            except Exception as e:
+                logger.warning(f"Answer stream broke off after {len(parts)} tokens: {e}")
+                yield _sse("error", {"detail": "Answer generation was interrupted, please retry"})
+                return
+
+            if parts:
+                final_answer = "".join(parts).strip()
+                if query_translated:
+                    cache.put(request.query, detected_lang, query_embedding, final_answer, sources_data)
+            else:
+                # Not cached, like the rule-based answers of /query
+                logger.info("Using rule-based fallback")
+                final_answer = rule_based_answer(english_query, context)
+                if detected_lang != "en":
+                    final_answer = await translate_from_english(final_answer, detected_lang)
+                yield _sse("token", {"text": final_answer})
+
+        processing_time = int((time.time() - start_time) * 1000)
+        query_id = await asave_query(request.query, detected_lang, final_answer, sources_data, processing_time)
+        yield _sse("done", {
+            "query_id": query_id,
+            "processing_time_ms": processing_time
+        })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _ndjson(data: dict) -> str:
+    return json.dumps(data, ensure_ascii=False) + "\n"
+
+
+def _query_error(query: str) -> Optional[str]:
+    if not query or len(query.strip()) < 3:
+        return "Query too short"
+    if len(query) > 1000:
+        return "Query too long (max 1000 characters)"
+    return None
+
+
+@router.post("/query/batch")
+async def batch_query(request: BatchQueryRequest):
+    """
+    Answer many questions in one request (nightly replays / offline evaluation).
+    Queries are translated one language group at a time, embedded and searched in
+    chunks, and answered with at most BATCH_LLM_CONCURRENCY LLM calls in flight.
+    Streams one NDJSON line per query as it completes (with its `index` in the
+    request), then a final `done` line. Batch answers skip the answer cache and
+    aren't recorded in the query log or stats.
+    """
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="No queries")
+    if len(request.queries) > BATCH_QUERY_MAX:
+        raise HTTPException(status_code=400, detail=f"Too many queries (max {BATCH_QUERY_MAX})")
+
+    return StreamingResponse(
+        _batch_answers(request.queries, request.top_k),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _batch_answers(items: List[BatchQueryItem], top_k: int):
+    start_time = time.time()
+    errors = 0
+    valid = []
+    for i, item in enumerate(items):
+        error = _query_error(item.query)
+        if error:
+            errors += 1
+            yield _ndjson({"index": i, "id": item.id, "error": error})
+        else:
+            valid.append(i)
+
+    languages = {i: items[i].language or detect_language(items[i].query) for i in valid}
+
+    # One translate_texts call per source language, all groups concurrently
+    groups: Dict[str, List[int]] = {}
+    for i in valid:
+        groups.setdefault(languages[i], []).append(i)
+    translated = await asyncio.gather(*(
+        translate_texts([items[i].query for i in members], lang, "en") for lang, members in groups.items()
+    ))
+    english = {i: text for members, texts in zip(groups.values(), translated) for i, text in zip(members, texts)}
+
+    rag = await aget_rag_engine()
+    llm_slots = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+
+    async def answer(i: int, docs: List[dict]) -> dict:
+        item_start = time.time()
+        lang = languages[i]
+        try:
+            async with llm_slots:
+                answer = await generate_answer(english[i], rag.build_context(docs))
+            final_answer = await translate_from_english(answer.text, lang)
+        except Exception as e:
+            logger.warning(f"Batch query {i} failed: {e}")
+            return {"index": i, "id": items[i].id, "error": str(e)}
+        return {
+            "index": i,
+            "id": items[i].id,
+            "answer": final_answer,
+            "sources": [{"id": d["id"], "title": d["title"], "category": d["category"]} for d in docs],
+            "detected_language": lang,
+            "method": answer.method,
+            "processing_time_ms": int((time.time() - item_start) * 1000),
+        }
+
+    pending = set()
+    try:
+        queries = [english[i] for i in valid]
+        async for offset, results in rag.aretrieve_many(queries, top_k, return_exceptions=True):
+            if isinstance(results, Exception):
+                # The chunk's queries fail individually; the rest of the batch carries on
+                for i in valid[offset:offset + BULK_RETRIEVE_CHUNK]:
+                    errors += 1
+                    yield _ndjson({"index": i, "id": items[i].id, "error": f"Retrieval failed: {results}"})
+                continue
+            for j, docs in enumerate(results):
+                pending.add(asyncio.create_task(answer(valid[offset + j], docs)))
+            # Flush whatever finished while this chunk was being searched
+            finished = {task for task in pending if task.done()}
+            pending -= finished
+            for task in finished:
+                result = task.result()
+                errors += "error" in result
+                yield _ndjson(result)
+        for next_done in asyncio.as_completed(pending):
+            result = await next_done
+            errors += "error" in result
+            yield _ndjson(result)
+        pending = set()
+    finally:
+        # Client went away: don't keep spending LLM calls on answers nobody will read
+        for task in pending:
+            task.cancel()
+
+    yield _ndjson({
+        "done": True,
+        "total": len(items),
+        "errors": errors,
+        "processing_time_ms": int((time.time() - start_time) * 1000),
+    })
+
+
+LANGUAGES_BODY = to_json_body({"languages": SUPPORTED_LANGUAGES})
+
 @router.get("/languages")
-async def get_languages():
-    return {"languages": SUPPORTED_LANGUAGES}
+async def get_languages(request: Request):
+    return json_response(LANGUAGES_BODY, request)
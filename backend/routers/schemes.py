@@ -1,5 +1,6 @@
 """Government Schemes router"""
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
+from utils.catalog import Catalog, CatalogHolder, json_response
 router = APIRouter()
 
 SCHEMES = [
@@ -11,8 +12,8 @@ SCHEMES = [
     {"id": "pmksy", "name": "PMKSY", "benefit": "55% subsidy on drip/sprinkler", "category": "irrigation", "link": "https://pmksy.gov.in"},
 ]
 
+catalog = CatalogHolder(Catalog([], SCHEMES))
+
 @router.get("/schemes")
-async def get_schemes(category: str = None):
-    if category:
-        return {"schemes": [s for s in SCHEMES if s["category"] == category]}
-    return {"schemes": SCHEMES}
+async def get_schemes(request: Request, category: str = None):
+    return json_response(catalog.current.schemes_body(category), request)
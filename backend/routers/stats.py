@@ -0,0 +1,22 @@
+"""Usage statistics router — served from the pre-aggregated stats tables"""
+from fastapi import APIRouter, HTTPException
+from utils.database import get_stats
+
+router = APIRouter()
+
+PERIODS = ("hour", "day")
+
+
+@router.get("/stats")
+def stats(period: str = "", limit: int = 24):
+    """
+    Running totals; with ?period=hour|day also the latest `limit` buckets of that period.
+    Plain def: FastAPI runs it in its threadpool, keeping the SQLite reads off the event loop.
+    """
+    totals = get_stats("total")
+    result = {"totals": totals[0] if totals else None}
+    if period:
+        if period not in PERIODS:
+            raise HTTPException(status_code=400, detail=f"period must be one of {', '.join(PERIODS)}")
+        result["series"] = get_stats(period, max(1, min(limit, 24 * 90)))
+    return result
@@ -0,0 +1,27 @@
+"""Exact-hit keys of the answer cache"""
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("faiss")
+
+from utils.answer_cache import AnswerCache, normalize_query
+
+
+def test_matras_are_kept():
+    assert normalize_query("किसान की फसल") == "किसान की फसल"
+    assert normalize_query("பூச்சி கட்டுப்பாடு?") == "பூச்சி கட்டுப்பாடு"
+
+
+def test_questions_differing_in_a_matra_do_not_collide():
+    assert normalize_query("कीट") != normalize_query("काट")
+
+    cache = AnswerCache()
+    cache.put("कीट नियंत्रण कैसे करें?", "hi", None, "pest answer", [])
+    assert cache.get_exact("काट नियंत्रण कैसे करें?", "hi") is None
+    assert cache.get_exact("कीट नियंत्रण कैसे करें", "hi")["answer"] == "pest answer"
+
+
+def test_punctuation_and_case_are_ignored():
+    assert normalize_query("  How to control APHIDS?? ") == "how to control aphids"
+    assert normalize_query("फसल।") == "फसल"
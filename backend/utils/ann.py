@@ -0,0 +1,191 @@
+"""
+KrishiSahay ANN Index Types
+Builds flat, IVF-Flat, HNSW or IVF-PQ FAISS indexes over normalized embeddings
+
+Configure per deployment (see `python -m utils.ann_benchmark` for recall vs latency):
+    FAISS_INDEX_TYPE   flat | ivf_flat | hnsw | ivf_pq
+    FAISS_NLIST        IVF cells (0 = 4·√n)
+    FAISS_NPROBE       IVF cells visited per query
+    FAISS_HNSW_M / FAISS_EF_CONSTRUCTION / FAISS_EF_SEARCH
+    FAISS_PQ_M / FAISS_PQ_NBITS   PQ sub-quantizers (must divide the dimension) and bits each
+    FAISS_STORAGE      float32 | float16 | int8 | binary — how flat / HNSW / IVF-Flat store vectors
+    FAISS_RERANK       with compact storage, candidates fetched per wanted hit and re-scored
+                       exactly against the full-precision (memory-mapped) embeddings
+"""
+
+import os
+import math
+import logging
+import faiss
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+STORAGE_TYPES = ("float32", "float16", "int8", "binary")
+
+# 2 bytes / 1 byte per dimension; binary keeps only the sign bit (1/32 of float32)
+SQ_TYPES = {
+    "float16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+# Keys that change the built structure (and so the persisted artifact); the rest are search-time
+BUILD_KEYS = {
+    "flat": (),
+    "ivf_flat": ("nlist",),
+    "hnsw": ("hnsw_m", "ef_construction"),
+    "ivf_pq": ("nlist", "pq_m", "pq_nbits"),
+}
+
+
+def index_spec_from_env() -> Dict:
+    spec = {
+        "type": os.getenv("FAISS_INDEX_TYPE", "flat"),
+        "nlist": int(os.getenv("FAISS_NLIST", "0")),
+        "nprobe": int(os.getenv("FAISS_NPROBE", "8")),
+        "hnsw_m": int(os.getenv("FAISS_HNSW_M", "32")),
+        "ef_construction": int(os.getenv("FAISS_EF_CONSTRUCTION", "80")),
+        "ef_search": int(os.getenv("FAISS_EF_SEARCH", "64")),
+        "pq_m": int(os.getenv("FAISS_PQ_M", "48")),
+        "pq_nbits": int(os.getenv("FAISS_PQ_NBITS", "8")),
+        "storage": os.getenv("FAISS_STORAGE", "float32"),
+        "rerank": int(os.getenv("FAISS_RERANK", "4")),
+    }
+    if spec["type"] not in INDEX_TYPES:
+        logger.warning(f"Unknown FAISS_INDEX_TYPE '{spec['type']}', using flat")
+        spec["type"] = "flat"
+    if spec["storage"] not in STORAGE_TYPES:
+        logger.warning(f"Unknown FAISS_STORAGE '{spec['storage']}', using float32")
+        spec["storage"] = "float32"
+    return spec
+
+
+def _storage(spec: Dict) -> str:
+    """Effective vector storage; IVF-PQ always stores its own PQ codes"""
+    return "float32" if spec["type"] == "ivf_pq" else spec.get("storage", "float32")
+
+
+def build_params(spec: Optional[Dict]) -> Dict:
+    spec = spec or {"type": "flat"}
+    params = {"type": spec["type"], **{k: spec[k] for k in BUILD_KEYS[spec["type"]]}}
+    if _storage(spec) != "float32":
+        params["storage"] = _storage(spec)
+    return params
+
+
+def _nlist(spec: Dict, n: int) -> int:
+    nlist = spec.get("nlist") or int(4 * math.sqrt(n))
+    # FAISS wants ~39 training points per centroid
+    return max(1, min(nlist, n // 39 or 1))
+
+
+def build_ann_index(embeddings: np.ndarray, spec: Optional[Dict] = None) -> faiss.Index:
+    """Create, train and fill an inner-product index over normalized embeddings"""
+    spec = spec or {"type": "flat"}
+    n, dimension = embeddings.shape
+    index_type = spec["type"]
+    storage = _storage(spec)
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+
+    if index_type == "ivf_pq" and (dimension % spec["pq_m"] or n < 2 ** spec["pq_nbits"]):
+        logger.warning(f"IVF-PQ needs pq_m | {dimension} and ≥{2 ** spec['pq_nbits']} vectors; using IVF-Flat")
+        index_type = "ivf_flat"
+    if index_type in ("ivf_flat", "ivf_pq") and n < 39:
+        logger.warning(f"Only {n} vectors — too few to train IVF; using flat")
+        index_type = "flat"
+    if n == 0:
+        # Nothing to train on; an empty flat index still searches (and returns no hits)
+        index_type, storage = "flat", "float32"
+    if storage == "binary" and index_type != "flat":
+        logger.warning(f"Binary storage only supports a flat scan; using flat instead of {index_type}")
+        index_type = "flat"
+
+    if index_type == "flat":
+        if storage == "binary":
+            # Sign bit per dimension, scanned by Hamming distance; rank with rerank_index()
+            index = faiss.IndexLSH(dimension, dimension, False, False)
+        elif storage in SQ_TYPES:
+            index = faiss.IndexScalarQuantizer(dimension, SQ_TYPES[storage], faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexFlatIP(dimension)
+    elif index_type == "hnsw":
+        if storage in SQ_TYPES:
+            index = faiss.IndexHNSWSQ(dimension, SQ_TYPES[storage], spec["hnsw_m"], faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexHNSWFlat(dimension, spec["hnsw_m"], faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = spec["ef_construction"]
+    else:
+        quantizer = faiss.IndexFlatIP(dimension)
+        nlist = _nlist(spec, n)
+        if index_type == "ivf_flat" and storage in SQ_TYPES:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, SQ_TYPES[storage], faiss.METRIC_INNER_PRODUCT)
+        elif index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, spec["pq_m"], spec["pq_nbits"], faiss.METRIC_INNER_PRODUCT)
+        logger.info(f"Training {index_type} index (nlist={nlist}) on {n} vectors...")
+
+    if not index.is_trained:
+        index.train(embeddings)
+    index.add(embeddings)
+    configure_search(index, spec)
+    return index
+
+
+class RerankedIndex:
+    """
+    Compact index for candidate generation, exact inner products for the final order.
+    `vectors` are the full-precision rows (normally the memory-mapped embeddings.npy),
+    so only the candidates' pages are ever read. Searches like a FAISS index.
+    """
+
+    def __init__(self, index: faiss.Index, vectors: np.ndarray, factor: int = 4):
+        self.index = index
+        self.vectors = vectors
+        self.factor = max(1, factor)
+
+    @property
+    def d(self) -> int:
+        return self.index.d
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        n_candidates = min(self.ntotal, k * self.factor)
+        _, candidates = self.index.search(queries, n_candidates)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        for r, row in enumerate(candidates):
+            row = row[row >= 0]
+            if not len(row):
+                continue
+            exact = np.asarray(self.vectors[row], dtype=np.float32) @ queries[r]
+            best = np.argsort(-exact)[:k]
+            scores[r, :len(best)] = exact[best]
+            ids[r, :len(best)] = row[best]
+        return scores, ids
+
+
+def rerank_index(index: faiss.Index, vectors: np.ndarray, spec: Optional[Dict] = None):
+    """Wrap a compactly stored index so its results are re-scored at full precision"""
+    if not spec or _storage(spec) == "float32":
+        return index
+    return RerankedIndex(index, vectors, spec.get("rerank", 4))
+
+
+def configure_search(index: faiss.Index, spec: Optional[Dict] = None):
+    """Apply search-time knobs (nprobe for IVF, efSearch for HNSW)"""
+    if not spec:
+        return
+    try:
+        faiss.extract_index_ivf(index).nprobe = spec["nprobe"]
+        return
+    except RuntimeError:
+        pass  # not an IVF index
+    hnsw = getattr(index, "hnsw", None)
+    if hnsw is not None:
+        hnsw.efSearch = spec["ef_search"]
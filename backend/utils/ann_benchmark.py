@@ -0,0 +1,141 @@
+"""
+KrishiSahay ANN Benchmark
+Recall@k vs latency of each FAISS index type against the exact flat baseline
+
+    python -m utils.ann_benchmark                          # stored RAG embeddings
+    python -m utils.ann_benchmark --embeddings kcc.npy --queries-file questions.txt
+    python -m utils.ann_benchmark --synthetic 100000       # clustered random vectors
+    python -m utils.ann_benchmark --storage float32,float16,int8,binary --types flat,hnsw
+
+Pick FAISS_INDEX_TYPE / FAISS_NPROBE / FAISS_EF_SEARCH / FAISS_STORAGE from the resulting table.
+Compact storage is measured with its full-precision re-rank (FAISS_RERANK), as served.
+"""
+
+import time
+import argparse
+import faiss
+import numpy as np
+from pathlib import Path
+from typing import Dict, List
+
+from utils.ann import build_ann_index, configure_search, index_spec_from_env, rerank_index
+from utils.index_store import INDEX_DIR, EMBEDDINGS_FILE
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    x = np.ascontiguousarray(x, dtype=np.float32)
+    faiss.normalize_L2(x)
+    return x
+
+
+def synthetic_corpus(n: int, dimension: int = 384, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    """Clustered vectors, closer to real sentence embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    assignment = rng.integers(0, clusters, n)
+    return _normalize(centers[assignment] + 0.6 * rng.standard_normal((n, dimension)).astype(np.float32))
+
+
+def sample_queries(corpus: np.ndarray, n: int, seed: int = 1) -> np.ndarray:
+    """Perturbed corpus vectors stand in for paraphrased questions"""
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(corpus), n)
+    return _normalize(corpus[rows] + 0.3 * rng.standard_normal((n, corpus.shape[1])).astype(np.float32))
+
+
+def _latencies(index: faiss.Index, queries: np.ndarray, k: int) -> np.ndarray:
+    out = np.empty(len(queries))
+    for i in range(len(queries)):
+        started = time.perf_counter()
+        index.search(queries[i:i + 1], k)
+        out[i] = time.perf_counter() - started
+    return out * 1000
+
+
+def benchmark(corpus: np.ndarray, queries: np.ndarray, k: int,
+              nprobes: List[int], ef_searches: List[int], types: List[str],
+              storages: List[str] = ("float32",)) -> List[Dict]:
+    base = index_spec_from_env()
+    exact = faiss.IndexFlatIP(corpus.shape[1])
+    exact.add(corpus)
+    _, truth = exact.search(queries, k)
+
+    rows = []
+    combos = [(t, st) for t in types for st in storages
+              if st == "float32" or (t != "ivf_pq" and (st != "binary" or t == "flat"))]
+    for index_type, storage in combos:
+        spec = dict(base, type=index_type, storage=storage)
+        started = time.perf_counter()
+        raw = build_ann_index(corpus, spec)
+        build_s = time.perf_counter() - started
+        size_mb = faiss.serialize_index(raw).nbytes / 1e6
+        index = rerank_index(raw, corpus, spec)
+
+        if index_type in ("ivf_flat", "ivf_pq"):
+            sweep = [("nprobe", v) for v in nprobes]
+        elif index_type == "hnsw":
+            sweep = [("ef_search", v) for v in ef_searches]
+        else:
+            sweep = [(None, None)]
+
+        for knob, value in sweep:
+            if knob:
+                configure_search(raw, dict(spec, **{knob: value}))
+            _, found = index.search(queries, k)
+            recall = np.mean([len(set(f[f >= 0]) & set(t)) / k for f, t in zip(found, truth)])
+            lat = _latencies(index, queries, k)
+            started = time.perf_counter()
+            index.search(queries, k)
+            batch_qps = len(queries) / (time.perf_counter() - started)
+            rows.append({
+                "type": index_type,
+                "storage": storage,
+                "knob": f"{knob}={value}" if knob else "-",
+                "build_s": build_s,
+                "size_mb": size_mb,
+                "recall": recall,
+                "p50_ms": float(np.percentile(lat, 50)),
+                "p95_ms": float(np.percentile(lat, 95)),
+                "batch_qps": batch_qps,
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs latency of FAISS index types")
+    parser.add_argument("--embeddings", type=Path, default=INDEX_DIR / "rag" / EMBEDDINGS_FILE,
+                        help="corpus vectors (.npy, normalized)")
+    parser.add_argument("--synthetic", type=int, default=0, help="benchmark N clustered random vectors instead")
+    parser.add_argument("--queries-file", type=Path, help="one question per line (encoded with the embedding model)")
+    parser.add_argument("--num-queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=4)
+    parser.add_argument("--types", default="flat,ivf_flat,hnsw,ivf_pq")
+    parser.add_argument("--nprobe", default="1,4,8,16,32")
+    parser.add_argument("--ef-search", default="16,32,64,128")
+    parser.add_argument("--storage", default="float32", help="comma-separated: float32,float16,int8,binary")
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.synthetic) if args.synthetic else _normalize(np.load(args.embeddings))
+    if args.queries_file:
+        from utils.embeddings import encode
+        queries = encode([line.strip() for line in open(args.queries_file, encoding="utf-8") if line.strip()])
+    else:
+        queries = sample_queries(corpus, args.num_queries)
+
+    rows = benchmark(
+        corpus, queries, args.k,
+        [int(v) for v in args.nprobe.split(",")],
+        [int(v) for v in args.ef_search.split(",")],
+        [t.strip() for t in args.types.split(",")],
+        [st.strip() for st in args.storage.split(",")],
+    )
+
+    print(f"corpus={len(corpus)} dim={corpus.shape[1]} queries={len(queries)} k={args.k}")
+    print(f"{'type':<9} {'storage':<8} {'knob':<13} {'build_s':>8} {'size_mb':>8} {'recall@k':>9} {'p50_ms':>8} {'p95_ms':>8} {'batch_qps':>10}")
+    for r in rows:
+        print(f"{r['type']:<9} {r['storage']:<8} {r['knob']:<13} {r['build_s']:>8.2f} {r['size_mb']:>8.1f} {r['recall']:>9.3f} "
+              f"{r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f} {r['batch_qps']:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+KrishiSahay Answer Cache
+Serves repeated questions without a new LLM generation:
+exact hits on normalized text, semantic hits on query-embedding similarity
+"""
+
+import os
+import re
+import time
+import logging
+import unicodedata
+import threading
+import faiss
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+# Cosine similarity between English query embeddings needed for a semantic hit
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CANDIDATES = 8
+
+# Word characters plus the Indic blocks, as in lexical_index: vowel signs (matras) and
+# viramas aren't \w, and dropping them would merge different words ("कीट" / "काट").
+# The dandas are punctuation, so they split words like the other punctuation does.
+_TOKEN = re.compile(r"[\w\u0900-\u0963\u0966-\u0DFF]+")
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(_TOKEN.findall(unicodedata.normalize("NFC", text).lower()))
+
+
+class AnswerCache:
+    """LRU + TTL cache of final answers, keyed by (language, normalized text) and by embedding"""
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL,
+                 threshold: float = ANSWER_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.kb_version: Optional[str] = None
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._by_key: Dict[tuple, int] = {}
+        self._index: Optional[faiss.IndexIDMap2] = None  # past query embeddings, id -> entry
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def ensure_version(self, kb_version: Optional[str]):
+        """Drop everything when the knowledge base the answers were built from changes"""
+        if kb_version != self.kb_version:
+            self.invalidate()
+            self.kb_version = kb_version
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_key.clear()
+            if self._index is not None:
+                self._index.reset()
+        logger.info("Answer cache invalidated")
+
+    def _live(self, entry_id: int) -> Optional[Dict]:
+        entry = self._entries.get(entry_id)
+        if entry is None:
+            return None
+        if entry["expires_at"] < time.time():
+            self._evict(entry_id)
+            return None
+        self._entries.move_to_end(entry_id)
+        return entry
+
+    def _evict(self, entry_id: int):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        if self._by_key.get(entry["key"]) == entry_id:
+            del self._by_key[entry["key"]]
+        if self._index is not None and entry["has_vector"]:
+            self._index.remove_ids(np.array([entry_id], dtype=np.int64))
+
+    def get_exact(self, query: str, language: str) -> Optional[Dict]:
+        with self._lock:
+            entry_id = self._by_key.get((language, normalize_query(query)))
+            entry = self._live(entry_id) if entry_id is not None else None
+            if entry:
+                self.exact_hits += 1
+            return entry
+
+    def get_similar(self, embedding: np.ndarray, language: str) -> Optional[Dict]:
+        with self._lock:
+            if self._index is None or self._index.ntotal == 0:
+                self.misses += 1
+                return None
+            query = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+            scores, ids = self._index.search(query, min(SEMANTIC_CANDIDATES, self._index.ntotal))
+            for score, entry_id in zip(scores[0], ids[0]):
+                if entry_id < 0 or score < self.threshold:
+                    break
+                entry = self._live(int(entry_id))
+                if entry and entry["language"] == language:
+                    self.semantic_hits += 1
+                    return entry
+            self.misses += 1
+            return None
+
+    def put(self, query: str, language: str, embedding: Optional[np.ndarray], answer: str, sources: List[Dict]):
+        with self._lock:
+            key = (language, normalize_query(query))
+            if key in self._by_key:
+                self._evict(self._by_key[key])
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "key": key,
+                "language": language,
+                "answer": answer,
+                "sources": sources,
+                "expires_at": time.time() + self.ttl,
+                "has_vector": embedding is not None,
+            }
+            self._by_key[key] = entry_id
+
+            if embedding is not None:
+                vector = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+                if self._index is None:
+                    self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+                self._index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)))
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "kb_version": self.kb_version,
+        }
+
+
+_answer_cache: Optional[AnswerCache] = None
+
+def get_answer_cache() -> AnswerCache:
+    global _answer_cache
+    if _answer_cache is None:
+        _answer_cache = AnswerCache()
+    return _answer_cache
@@ -0,0 +1,118 @@
+"""
+KrishiSahay Batching Embedder
+Coalesces concurrent single-query searches into one encode + one index.search
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.concurrency import run_cpu
+
+logger = logging.getLogger(__name__)
+
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+
+
+class BatchingEmbedder:
+    """
+    Collects queries that arrive within max_wait_ms of each other (up to max_batch)
+    and runs them through batch_fn(queries, top_ks) -> one result per query on the
+    CPU executor. Each caller awaits only its own result.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[str], List[int]], List[Any]],
+                 max_batch: int = EMBED_MAX_BATCH, max_wait_ms: float = EMBED_MAX_WAIT_MS,
+                 name: str = "embedder"):
+        self.batch_fn = batch_fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.name = name
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.batches = 0
+        self.items = 0
+        self.batch_sizes: Dict[int, int] = {}
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+
+    async def submit(self, query: str, top_k: int) -> Any:
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, top_k, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self) -> List:
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                # Still drain anything that is already waiting
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            batch = [item for item in batch if not item[2].cancelled()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            for *_, enqueued_at in batch:
+                wait = started - enqueued_at
+                self.queue_wait_total += wait
+                self.queue_wait_max = max(self.queue_wait_max, wait)
+            self.batches += 1
+            self.items += len(batch)
+            self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+
+            try:
+                results = await run_cpu(self.batch_fn, [b[0] for b in batch], [b[1] for b in batch])
+            except Exception as e:
+                logger.warning(f"{self.name} batch of {len(batch)} failed: {e}")
+                for _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, _, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            "batches": self.batches,
+            "queries": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0,
+            "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+            "avg_queue_wait_ms": round(self.queue_wait_total / self.items * 1000, 3) if self.items else 0,
+            "max_queue_wait_ms": round(self.queue_wait_max * 1000, 3),
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+        }
@@ -0,0 +1,106 @@
+"""
+KrishiSahay Catalog
+Immutable, precomputed lookup tables for the read-only KB / scheme endpoints,
+with every response body serialized (and ETagged) once per KB version, served
+with Cache-Control and answered with 304 when the client already has it
+"""
+
+import os
+import json
+import hashlib
+import threading
+from types import MappingProxyType
+from typing import Dict, List, NamedTuple, Optional
+from starlette.requests import Request
+from starlette.responses import Response
+
+# Catalog content only changes on deploy / KB reload: clients and nginx reuse it for
+# CATALOG_MAX_AGE, then may keep serving it while they revalidate with If-None-Match
+CATALOG_MAX_AGE = int(os.getenv("CATALOG_MAX_AGE", "300"))
+CATALOG_STALE_WHILE_REVALIDATE = int(os.getenv("CATALOG_STALE_WHILE_REVALIDATE", "86400"))
+CATALOG_CACHE_CONTROL = f"public, max-age={CATALOG_MAX_AGE}, stale-while-revalidate={CATALOG_STALE_WHILE_REVALIDATE}"
+
+
+class JSONBody(NamedTuple):
+    body: bytes
+    etag: str
+
+
+def to_json_body(content) -> JSONBody:
+    # Same encoding as Starlette's JSONResponse, so clients see identical bytes
+    body = json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+    return JSONBody(body, f'"{hashlib.sha1(body).hexdigest()[:20]}"')
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison (RFC 9110 §13.1.2): W/"abc" matches "abc" too"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def json_response(entry: JSONBody, request: Optional[Request] = None,
+                  cache_control: str = CATALOG_CACHE_CONTROL) -> Response:
+    """
+    Send pre-serialized bytes as-is, skipping response-model validation and encoding;
+    a 304 with no body when the request's If-None-Match already names this version
+    """
+    headers = {"ETag": entry.etag, "Cache-Control": cache_control}
+    if request is not None and etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+class Catalog:
+    """
+    Snapshot of the KB items and schemes: id → item, category → item ids, category
+    counts and schemes by category, plus the serialized responses built from them.
+    Never mutated after construction; a reload builds a new Catalog and swaps it in.
+    """
+
+    def __init__(self, items: List[Dict], schemes: List[Dict]):
+        self.items = MappingProxyType({item["id"]: item for item in items})
+        category_ids: Dict[str, List[str]] = {}
+        for item in items:
+            category_ids.setdefault(item["category"], []).append(item["id"])
+        self.category_ids = MappingProxyType({c: tuple(ids) for c, ids in category_ids.items()})
+        self.category_counts = MappingProxyType({c: len(ids) for c, ids in category_ids.items()})
+
+        by_category: Dict[str, List[Dict]] = {}
+        for scheme in schemes:
+            by_category.setdefault(scheme["category"], []).append(scheme)
+        self.schemes = tuple(schemes)
+        self.schemes_by_category = MappingProxyType({c: tuple(s) for c, s in by_category.items()})
+
+        self._item_bodies = {item_id: to_json_body(item) for item_id, item in self.items.items()}
+        self.categories_body = to_json_body(
+            {"categories": [{"name": c, "count": n} for c, n in self.category_counts.items()]}
+        )
+        self._scheme_bodies = {
+            category: to_json_body({"schemes": list(s), "total": len(s)})
+            for category, s in [("", self.schemes), *self.schemes_by_category.items()]
+        }
+        self._empty_schemes = to_json_body({"schemes": [], "total": 0})
+
+    def item_body(self, item_id: str) -> Optional[JSONBody]:
+        return self._item_bodies.get(item_id)
+
+    def schemes_body(self, category: Optional[str] = None) -> JSONBody:
+        return self._scheme_bodies.get(category or "", self._empty_schemes)
+
+
+class CatalogHolder:
+    """Publishes the current Catalog; readers take `.current` once per request"""
+
+    def __init__(self, catalog: Optional[Catalog] = None):
+        self.current = catalog or Catalog([], [])
+        self._lock = threading.Lock()
+
+    def reload(self, items: List[Dict], schemes: List[Dict]) -> Catalog:
+        """Build the new snapshot off to the side, then swap it in with one assignment"""
+        with self._lock:
+            catalog = Catalog(items, schemes)
+            self.current = catalog
+        return catalog
@@ -0,0 +1,125 @@
+"""
+KrishiSahay Chunking
+Splits documents into overlapping passages for retrieval, and packs the best
+retrieved passages into a token budget for the LLM prompt
+"""
+
+import os
+import re
+from typing import Dict, List
+
+# Passage size and the words shared with the next passage (whole sentences only)
+PASSAGE_WORDS = int(os.getenv("PASSAGE_WORDS", "64"))
+PASSAGE_OVERLAP = int(os.getenv("PASSAGE_OVERLAP", "16"))
+# Prompt space for retrieved text, in (estimated) LLM tokens
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "600"))
+
+# Sentence ends: Latin punctuation and the Devanagari danda
+_SENTENCE_END = re.compile(r"(?<=[.!?।])\s+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_END.split(text) if s.strip()]
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for the English prompts we send)"""
+    return len(text) // 4 + 1
+
+
+def _units(text: str, max_words: int) -> List[str]:
+    """Sentences, with any sentence longer than a passage cut into passage-sized pieces"""
+    units = []
+    for sentence in split_sentences(text):
+        words = sentence.split()
+        for i in range(0, len(words), max_words):
+            units.append(" ".join(words[i:i + max_words]))
+    return units
+
+
+def split_passages(text: str, max_words: int = PASSAGE_WORDS, overlap: int = PASSAGE_OVERLAP) -> List[str]:
+    """
+    Sentence-aligned passages of at most `max_words` words. Each passage starts with the
+    trailing sentences (up to `overlap` words) of the previous one, so a fact that straddles
+    a boundary is still retrievable from a single passage.
+    """
+    passages: List[str] = []
+    current: List[str] = []
+    count = 0
+    for unit in _units(text, max_words):
+        n = len(unit.split())
+        if current and count + n > max_words:
+            passages.append(" ".join(current))
+            carry: List[str] = []
+            carried = 0
+            for prev in reversed(current):
+                w = len(prev.split())
+                if carried + w > overlap:
+                    break
+                carry.insert(0, prev)
+                carried += w
+            current, count = carry, carried
+        current.append(unit)
+        count += n
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+def _sentence_key(sentence: str) -> str:
+    return _WHITESPACE.sub(" ", sentence).strip().lower()
+
+
+def pack_context(docs: List[Dict], budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """
+    Build the LLM context block from ranked docs within `budget` tokens.
+
+    Each doc may carry `passages` ({"text", "passage_no", "score"}, best first); docs
+    without them are split on the fly. Passages are taken greedily — every doc's best
+    passage in rank order, then every doc's second best, and so on — skipping sentences
+    already packed, so overlapping passages don't repeat text.
+    """
+    candidates = []
+    for doc in docs:
+        passages = doc.get("passages")
+        if passages is None:
+            passages = [{"text": t, "passage_no": n, "score": 0.0} for n, t in enumerate(split_passages(doc["content"]))]
+        candidates.append(passages)
+
+    seen = set()
+    picked: Dict[int, List] = {}
+    used = 0
+    for tier in range(max((len(p) for p in candidates), default=0)):
+        for rank, passages in enumerate(candidates):
+            if tier >= len(passages):
+                continue
+            passage = passages[tier]
+            fresh = [s for s in split_sentences(passage["text"]) if _sentence_key(s) not in seen]
+            if not fresh:
+                continue
+            text = " ".join(fresh)
+            cost = estimate_tokens(text)
+            if rank not in picked:
+                cost += estimate_tokens(f"[Source 0: {docs[rank]['title']}]")
+            if used + cost > budget:
+                if picked:
+                    continue
+                # The single best passage is over budget on its own: truncate rather than send nothing
+                text = text[:max(budget - (cost - estimate_tokens(text)), 1) * 4]
+                cost = budget
+            seen.update(_sentence_key(s) for s in fresh)
+            picked.setdefault(rank, []).append((passage.get("passage_no", 0), text))
+            used += cost
+
+    context_parts = []
+    for i, rank in enumerate(sorted(picked), 1):
+        # Passages of one doc read in document order; gaps between them are marked
+        body, last = "", None
+        for passage_no, text in sorted(picked[rank], key=lambda p: p[0]):
+            if last is not None:
+                body += " " if passage_no == last + 1 else " … "
+            body += text
+            last = passage_no
+        context_parts.append(f"[Source {i}: {docs[rank]['title']}]\n{body}")
+    return "\n\n".join(context_parts)
@@ -0,0 +1,92 @@
+"""
+KrishiSahay Concurrency Helpers
+Bounded executor for CPU-bound work and admission control for the query pipeline
+"""
+
+import os
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# Embedding + FAISS search threads; torch/faiss already parallelize internally
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", "2"))
+MAX_INFLIGHT_QUERIES = int(os.getenv("MAX_INFLIGHT_QUERIES", "32"))
+MAX_QUEUED_QUERIES = int(os.getenv("MAX_QUEUED_QUERIES", "64"))
+QUERY_QUEUE_TIMEOUT = float(os.getenv("QUERY_QUEUE_TIMEOUT", "5"))
+
+_cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="krishi-cpu")
+# KB ingestion (bulk encoding, SQLite writes, live-index sync) gets one thread of its own,
+# so a large import queues behind itself instead of in front of query embedding
+_ingest_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="krishi-ingest")
+
+
+async def run_cpu(fn: Callable, *args, **kwargs):
+    """Run a CPU-bound call on the dedicated executor without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_cpu_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def run_ingest(fn: Callable, *args, **kwargs):
+    """Run knowledge-base ingestion work on its single background thread"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_ingest_executor, functools.partial(fn, *args, **kwargs))
+
+
+def shutdown_cpu_executor():
+    _cpu_executor.shutdown(wait=False, cancel_futures=True)
+    _ingest_executor.shutdown(wait=False, cancel_futures=True)
+
+
+class Overloaded(Exception):
+    """Raised when a request can't be admitted within the queue limits"""
+
+
+class AdmissionController:
+    """Caps concurrent queries; excess requests wait in a bounded queue or are rejected"""
+
+    def __init__(self, max_inflight: int = MAX_INFLIGHT_QUERIES,
+                 max_queued: int = MAX_QUEUED_QUERIES,
+                 queue_timeout: float = QUERY_QUEUE_TIMEOUT):
+        self.max_inflight = max_inflight
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_inflight)
+        self._inflight = 0
+        self._queued = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def admit(self):
+        if self._semaphore.locked() and self._queued >= self.max_queued:
+            self.rejected += 1
+            raise Overloaded("query queue full")
+
+        self._queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded("timed out waiting for a query slot")
+        finally:
+            self._queued -= 1
+
+        self._inflight += 1
+        try:
+            yield
+        finally:
+            self._inflight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict:
+        return {
+            "inflight": self._inflight,
+            "queued": self._queued,
+            "rejected": self.rejected,
+            "max_inflight": self.max_inflight,
+            "max_queued": self.max_queued,
+        }
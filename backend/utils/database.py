@@ -1,19 +1,55 @@
 """KrishiSahay Database — SQLite for feedback and cache"""
 
+import os
+import queue
+import socket
+import asyncio
 import sqlite3
 import json
+import time
 import logging
+import threading
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from utils.metrics import span
 
 logger = logging.getLogger(__name__)
 DB_PATH = Path(__file__).parent.parent / "data" / "krishisahay.db"
 
+# Background writer: saves per commit, and pending saves before new ones are dropped.
+# A save is one query or feedback row together with its stats upserts.
+DB_WRITE_BATCH = int(os.getenv("DB_WRITE_BATCH", "256"))
+DB_WRITE_QUEUE_MAX = int(os.getenv("DB_WRITE_QUEUE_MAX", "10000"))
+# Query ids each process claims at a time, so ids can be handed out before the row is written
+QUERY_ID_BLOCK = 100
+# Raw query/feedback rows older than this are deleted (their counts live on in the
+# stats aggregates); hourly aggregates are kept for less time than daily ones. 0 = keep forever.
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "90"))
+HOURLY_STATS_RETENTION_DAYS = int(os.getenv("HOURLY_STATS_RETENTION_DAYS", "14"))
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", "3600"))
+
+_local = threading.local()
+
 
-def get_connection():
+def _connect() -> sqlite3.Connection:
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, timeout=10)
     conn.row_factory = sqlite3.Row
+    # WAL lets readers run alongside the writer; NORMAL only fsyncs at checkpoints
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def get_connection() -> sqlite3.Connection:
+    """This thread's long-lived connection (opened on first use)"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = _connect()
     return conn
 
 
@@ -28,9 +64,12 @@ def init_db():
             language TEXT DEFAULT 'en',
             answer TEXT,
             sources TEXT,
+            latency_ms INTEGER,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
+    if "latency_ms" not in {row["name"] for row in cursor.execute("PRAGMA table_info(queries)")}:
+        cursor.execute("ALTER TABLE queries ADD COLUMN latency_ms INTEGER")
 
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS feedback (
@@ -42,34 +81,409 @@ def init_db():
             FOREIGN KEY (query_id) REFERENCES queries(id)
         )
     """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_queries_created_at ON queries(created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_queries_language ON queries(language)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_feedback_query_id ON feedback(query_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_feedback_created_at ON feedback(created_at)")
+
+    # Named leases so periodic jobs run in one worker at a time (see retention_loop)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+
+    # Rolling aggregates per (period, bucket): period is 'hour' / 'day' (bucket = UTC
+    # '2025-01-31T13' / '2025-01-31') or 'total' (bucket 'all'). Updated in the same
+    # transaction as the raw rows, so reading them never scans history.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stats_buckets (
+            period TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            queries INTEGER DEFAULT 0,
+            latency_ms_sum INTEGER DEFAULT 0,
+            feedback INTEGER DEFAULT 0,
+            rating_sum INTEGER DEFAULT 0,
+            positive INTEGER DEFAULT 0,
+            PRIMARY KEY (period, bucket)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stats_languages (
+            period TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            language TEXT NOT NULL,
+            queries INTEGER DEFAULT 0,
+            PRIMARY KEY (period, bucket, language)
+        )
+    """)
+    # Latency histogram; slot i counts queries at or below LATENCY_SLOTS_MS[i]
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stats_latency (
+            period TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            slot INTEGER NOT NULL,
+            queries INTEGER DEFAULT 0,
+            PRIMARY KEY (period, bucket, slot)
+        )
+    """)
+
+    # Ingested knowledge-base documents (see utils/ingest.py), split into passages.
+    # kb_passages.vector_id is the FAISS id; seq orders changes so every worker can
+    # replay them into its live index.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS kb_documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            doc_id TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            title TEXT,
+            content TEXT,
+            category TEXT,
+            subcategory TEXT,
+            tags TEXT,
+            deleted INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS kb_passages (
+            vector_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            document_id INTEGER NOT NULL,
+            passage_no INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            embedding BLOB,
+            deleted INTEGER DEFAULT 0,
+            seq INTEGER NOT NULL,
+            FOREIGN KEY (document_id) REFERENCES kb_documents(id)
+        )
+    """)
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_kb_documents_hash ON kb_documents(content_hash) WHERE deleted = 0")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_kb_documents_doc_id ON kb_documents(doc_id) WHERE deleted = 0")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_kb_passages_seq ON kb_passages(seq)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_kb_passages_document ON kb_passages(document_id)")
+
+    # Translations by (source, target, sha1 of the source text), see utils/translation_cache.py
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS translations (
+            source TEXT NOT NULL,
+            target TEXT NOT NULL,
+            text_hash TEXT NOT NULL,
+            translated TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (source, target, text_hash)
+        )
+    """)
 
     conn.commit()
-    conn.close()
     logger.info("Database initialized")
 
 
-def save_query(query_text: str, language: str, answer: str, sources: list) -> int:
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO queries (query_text, language, answer, sources) VALUES (?, ?, ?, ?)",
-        (query_text, language, answer, json.dumps(sources))
-    )
-    query_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+# ─────────────────────────────────────────────────────────────
+# Batched background writes
+# ─────────────────────────────────────────────────────────────
+
+class DatabaseWriter:
+    """
+    Single writer thread with its own connection. Callers enqueue a save, i.e. the
+    list of (sql, params) that belong together, and return immediately; the thread
+    commits whatever has queued up as one transaction, so under load many saves share
+    a single commit. A save is queued, dropped or committed as a whole, so a query
+    row and its stats aggregates can't drift apart.
+    """
+
+    def __init__(self, batch_size: int = DB_WRITE_BATCH, max_queued: int = DB_WRITE_QUEUE_MAX):
+        self.batch_size = batch_size
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queued)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, writes: List[Tuple[str, tuple]]):
+        self.start()
+        try:
+            self._queue.put_nowait(writes)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("Database write queue full, dropping save")
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued so far is committed"""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 10):
+        """Commit pending writes and stop the thread"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        conn = _connect()
+        stopping = False
+        while not stopping:
+            items = [self._queue.get()]
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            saves = []
+            events = []
+            for item in items:
+                if item is None:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    events.append(item)
+                else:
+                    saves.append(item)
+            if saves:
+                self._commit(conn, saves)
+            for event in events:
+                event.set()
+        conn.close()
+
+    @staticmethod
+    def _execute(conn: sqlite3.Connection, saves: List[List[Tuple[str, tuple]]]):
+        # One executemany per statement, in first-seen order. Queued writes are inserts
+        # and additive upserts, so only the order among the same statement matters.
+        grouped: Dict[str, List[tuple]] = {}
+        for writes in saves:
+            for sql, params in writes:
+                grouped.setdefault(sql, []).append(params)
+        with span("sqlite_write"), conn:
+            for sql, rows in grouped.items():
+                conn.executemany(sql, rows)
+
+    def _commit(self, conn: sqlite3.Connection, saves: List[List[Tuple[str, tuple]]]):
+        try:
+            self._execute(conn, saves)
+            self.written += len(saves)
+            self.batches += 1
+            return
+        except sqlite3.Error as e:
+            if len(saves) == 1:
+                self.failed += 1
+                logger.error(f"Database save failed: {e}")
+                return
+            logger.warning(f"Database batch of {len(saves)} saves failed ({e}), retrying one by one")
+        # The batch rolled back as a whole; retry each save alone so one bad save only loses itself
+        for writes in saves:
+            self._commit(conn, [writes])
+
+    def stats(self) -> Dict:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "avg_batch": round(self.written / self.batches, 2) if self.batches else 0,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+class QueryIdAllocator:
+    """
+    Hands out queries.id values without touching the database per query: each process
+    claims blocks of ids by bumping sqlite_sequence (shared by all workers). The first
+    ids are claimed at startup (prime) and the next block is claimed in the background
+    while a whole block is still left, so request handlers never wait on SQLite.
+    """
+
+    def __init__(self, block: int = QUERY_ID_BLOCK):
+        self.block = block
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._pending: Optional[Tuple[int, int]] = None
+        self._prefetching = False
+        self._pid: Optional[int] = None
+
+    def _claim(self, size: Optional[int] = None) -> Tuple[int, int]:
+        size = size or self.block
+        conn = _connect()
+        try:
+            with span("sqlite_id_claim"), conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(
+                    "INSERT INTO sqlite_sequence (name, seq) SELECT 'queries', COALESCE(MAX(id), 0) FROM queries "
+                    "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'queries')"
+                )
+                conn.execute("UPDATE sqlite_sequence SET seq = seq + ? WHERE name = 'queries'", (size,))
+                end = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'queries'").fetchone()[0]
+            return end - size + 1, end + 1
+        finally:
+            conn.close()
+
+    def prime(self):
+        """Claim two blocks' worth of ids up front (call at startup, in each worker)"""
+        claimed = self._claim(2 * self.block)
+        with self._lock:
+            self._next, self._end = claimed
+            self._pending = None
+            self._pid = os.getpid()
+
+    def _prefetch(self):
+        try:
+            claimed = self._claim()
+            with self._lock:
+                self._pending = claimed
+        except sqlite3.Error as e:
+            logger.warning(f"Query id prefetch failed: {e}")
+        finally:
+            self._prefetching = False
+
+    def _take(self) -> Optional[int]:
+        """Next id from the blocks on hand (caller holds the lock)"""
+        if self._pid != os.getpid():
+            # Blocks claimed before a fork belong to the parent
+            self._next = self._end = 0
+            self._pending = None
+            self._prefetching = False
+            self._pid = os.getpid()
+        if self._next >= self._end:
+            if self._pending is None:
+                return None
+            self._next, self._end = self._pending
+            self._pending = None
+        query_id = self._next
+        self._next += 1
+        return query_id
+
+    def try_reserve(self) -> Optional[int]:
+        """An id without touching the database, or None if the prefetch fell behind"""
+        with self._lock:
+            query_id = self._take()
+            start_prefetch = (not self._prefetching and self._pending is None
+                              and self._end - self._next <= self.block)
+            if start_prefetch:
+                self._prefetching = True
+        if start_prefetch:
+            threading.Thread(target=self._prefetch, name="query-id-prefetch", daemon=True).start()
+        return query_id
+
+    def reserve(self) -> int:
+        """Blocking: claims a block itself when none is on hand (scripts, worker threads)"""
+        query_id = self.try_reserve()
+        while query_id is None:
+            claimed = self._claim()
+            with self._lock:
+                if self._pending is None:
+                    self._pending = claimed
+            query_id = self.try_reserve()
+        return query_id
+
+    async def areserve(self) -> int:
+        """For request handlers: a claim, if one is ever needed, runs off the event loop"""
+        query_id = self.try_reserve()
+        if query_id is None:
+            logger.warning("Query id prefetch fell behind; claiming a block in a thread")
+            query_id = await asyncio.to_thread(self.reserve)
+        return query_id
+
+
+_writer = DatabaseWriter()
+_query_ids = QueryIdAllocator()
+
+
+def prime_query_ids():
+    """Claim this process's first query ids (call at startup, after init_db)"""
+    _query_ids.prime()
+
+
+def close_writer():
+    """Flush queued writes (call on shutdown)"""
+    _writer.close()
+
+
+def flush_writes(timeout: Optional[float] = None) -> bool:
+    return _writer.flush(timeout)
+
+
+def writer_stats() -> Dict:
+    return _writer.stats()
+
+
+# Upper bounds (ms) of the latency histogram slots; one more slot catches anything slower
+LATENCY_SLOTS_MS = (100, 250, 500, 1000, 2000, 3000, 5000, 10000, 20000, 30000, 60000)
+
+_STATS_QUERY_SQL = (
+    "INSERT INTO stats_buckets (period, bucket, queries, latency_ms_sum) VALUES (?, ?, 1, ?) "
+    "ON CONFLICT(period, bucket) DO UPDATE SET "
+    "queries = queries + 1, latency_ms_sum = latency_ms_sum + excluded.latency_ms_sum"
+)
+_STATS_FEEDBACK_SQL = (
+    "INSERT INTO stats_buckets (period, bucket, feedback, rating_sum, positive) VALUES (?, ?, 1, ?, ?) "
+    "ON CONFLICT(period, bucket) DO UPDATE SET feedback = feedback + 1, "
+    "rating_sum = rating_sum + excluded.rating_sum, positive = positive + excluded.positive"
+)
+_STATS_LANGUAGE_SQL = (
+    "INSERT INTO stats_languages (period, bucket, language, queries) VALUES (?, ?, ?, 1) "
+    "ON CONFLICT(period, bucket, language) DO UPDATE SET queries = queries + 1"
+)
+_STATS_LATENCY_SQL = (
+    "INSERT INTO stats_latency (period, bucket, slot, queries) VALUES (?, ?, ?, 1) "
+    "ON CONFLICT(period, bucket, slot) DO UPDATE SET queries = queries + 1"
+)
+
+
+def _stat_buckets(ts: Optional[float] = None) -> List[Tuple[str, str]]:
+    t = time.gmtime(ts)
+    return [("hour", time.strftime("%Y-%m-%dT%H", t)), ("day", time.strftime("%Y-%m-%d", t)), ("total", "all")]
+
+
+def _latency_slot(latency_ms: int) -> int:
+    return bisect_left(LATENCY_SLOTS_MS, latency_ms)
+
+
+def save_query(query_text: str, language: str, answer: str, sources: list, latency_ms: Optional[int] = None) -> int:
+    """Queue the row and return its id straight away; the writer commits it shortly after"""
+    return _queue_query(_query_ids.reserve(), query_text, language, answer, sources, latency_ms)
+
+
+async def asave_query(query_text: str, language: str, answer: str, sources: list, latency_ms: Optional[int] = None) -> int:
+    """save_query() for async handlers: never blocks the event loop"""
+    return _queue_query(await _query_ids.areserve(), query_text, language, answer, sources, latency_ms)
+
+
+def _queue_query(query_id: int, query_text: str, language: str, answer: str, sources: list,
+                 latency_ms: Optional[int]) -> int:
+    writes = [(
+        "INSERT INTO queries (id, query_text, language, answer, sources, latency_ms) VALUES (?, ?, ?, ?, ?, ?)",
+        (query_id, query_text, language, answer, json.dumps(sources), latency_ms)
+    )]
+    for period, bucket in _stat_buckets():
+        writes.append((_STATS_QUERY_SQL, (period, bucket, latency_ms or 0)))
+        writes.append((_STATS_LANGUAGE_SQL, (period, bucket, language)))
+        if latency_ms is not None:
+            writes.append((_STATS_LATENCY_SQL, (period, bucket, _latency_slot(latency_ms))))
+    _writer.submit(writes)
     return query_id
 
 
 def save_feedback(query_id: int, rating: int, comment: str = ""):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
+    writes = [(
         "INSERT INTO feedback (query_id, rating, comment) VALUES (?, ?, ?)",
         (query_id, rating, comment)
-    )
-    conn.commit()
-    conn.close()
+    )]
+    for period, bucket in _stat_buckets():
+        writes.append((_STATS_FEEDBACK_SQL, (period, bucket, rating, int(rating > 0))))
+    _writer.submit(writes)
 
 
 def get_recent_queries(limit: int = 10):
@@ -78,6 +492,346 @@ def get_recent_queries(limit: int = 10):
     cursor.execute(
         "SELECT * FROM queries ORDER BY created_at DESC LIMIT ?", (limit,)
     )
-    rows = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return rows
+    return [dict(row) for row in cursor.fetchall()]
+
+
+def _percentile(histogram: Dict[int, int], total: int, q: float) -> Optional[int]:
+    """Upper bound of the histogram slot holding the q-quantile (slowest slot reports its lower bound)"""
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for slot in sorted(histogram):
+        seen += histogram[slot]
+        if seen >= rank:
+            return LATENCY_SLOTS_MS[min(slot, len(LATENCY_SLOTS_MS) - 1)]
+    return LATENCY_SLOTS_MS[-1]
+
+
+def get_stats(period: str = "total", limit: int = 1) -> List[Dict]:
+    """
+    Aggregates for the latest `limit` buckets of a period ('hour', 'day' or 'total'),
+    newest first. Reads a bounded number of pre-aggregated rows, whatever the history size.
+    """
+    conn = get_connection()
+    rows = conn.execute(
+        "SELECT * FROM stats_buckets WHERE period = ? ORDER BY bucket DESC LIMIT ?", (period, limit)
+    ).fetchall()
+    if not rows:
+        return []
+    buckets = [r["bucket"] for r in rows]
+    placeholders = ",".join("?" * len(buckets))
+    languages: Dict[str, Dict[str, int]] = {b: {} for b in buckets}
+    for r in conn.execute(
+        f"SELECT bucket, language, queries FROM stats_languages WHERE period = ? AND bucket IN ({placeholders})",
+        [period] + buckets
+    ):
+        languages[r["bucket"]][r["language"]] = r["queries"]
+    latency: Dict[str, Dict[int, int]] = {b: {} for b in buckets}
+    for r in conn.execute(
+        f"SELECT bucket, slot, queries FROM stats_latency WHERE period = ? AND bucket IN ({placeholders})",
+        [period] + buckets
+    ):
+        latency[r["bucket"]][r["slot"]] = r["queries"]
+
+    stats = []
+    for r in rows:
+        histogram = latency[r["bucket"]]
+        timed = sum(histogram.values())
+        stats.append({
+            "period": period,
+            "bucket": r["bucket"],
+            "queries": r["queries"],
+            "languages": languages[r["bucket"]],
+            "avg_latency_ms": round(r["latency_ms_sum"] / timed) if timed else None,
+            "p50_latency_ms": _percentile(histogram, timed, 0.50),
+            "p95_latency_ms": _percentile(histogram, timed, 0.95),
+            "p99_latency_ms": _percentile(histogram, timed, 0.99),
+            "feedback": r["feedback"],
+            # Mean of the stored ±1 helpful votes, in -1..1 (not the 1-5 rating the frontend sends)
+            "avg_feedback": round(r["rating_sum"] / r["feedback"], 2) if r["feedback"] else 0,
+            "positive_rate": round(r["positive"] / r["feedback"], 3) if r["feedback"] else 0,
+        })
+    return stats
+
+
+def compact(retention_days: int = RETENTION_DAYS, hourly_days: int = HOURLY_STATS_RETENTION_DAYS,
+            chunk_size: int = 5000) -> Dict[str, int]:
+    """
+    Apply the retention policy. Raw rows are deleted in short chunked transactions so
+    the writer thread is never locked out for long.
+    """
+    conn = get_connection()
+    removed = {}
+    if retention_days > 0:
+        for table in ("queries", "feedback"):
+            removed[table] = 0
+            while True:
+                with conn:
+                    cursor = conn.execute(
+                        f"DELETE FROM {table} WHERE id IN "
+                        f"(SELECT id FROM {table} WHERE created_at < datetime('now', ?) LIMIT ?)",
+                        (f"-{retention_days} days", chunk_size)
+                    )
+                removed[table] += cursor.rowcount
+                if cursor.rowcount < chunk_size:
+                    break
+    if hourly_days > 0:
+        cutoff = time.strftime("%Y-%m-%dT%H", time.gmtime(time.time() - hourly_days * 86400))
+        with conn:
+            removed["hourly_buckets"] = conn.execute(
+                "DELETE FROM stats_buckets WHERE period = 'hour' AND bucket < ?", (cutoff,)
+            ).rowcount
+            for table in ("stats_languages", "stats_latency"):
+                conn.execute(f"DELETE FROM {table} WHERE period = 'hour' AND bucket < ?", (cutoff,))
+    return removed
+
+
+def acquire_lease(name: str, ttl: float) -> bool:
+    """
+    Take (or renew) the named lease for ttl seconds; False while another process holds
+    it. A single upsert, so two workers can never both get it.
+    """
+    holder = f"{socket.gethostname()}:{os.getpid()}"
+    now = time.time()
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute(
+            "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+            "WHERE leases.expires_at < ? OR leases.holder = excluded.holder",
+            (name, holder, now + ttl, now)
+        )
+    return cursor.rowcount > 0
+
+
+def compact_once(interval: float = RETENTION_INTERVAL) -> Optional[Dict[str, int]]:
+    """compact() if this process holds the retention lease for the coming interval, else None"""
+    if not acquire_lease("retention", interval):
+        return None
+    return compact()
+
+
+async def retention_loop(interval: float = RETENTION_INTERVAL):
+    """
+    Periodically compact the database. Runs in every worker, but the retention lease
+    lets only one of them compact per interval, and it runs on its own thread so the
+    deletes never hold up the CPU executor that serves queries.
+    """
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="retention")
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            try:
+                removed = await loop.run_in_executor(executor, compact_once, interval)
+                if removed and any(removed.values()):
+                    logger.info(f"Retention: removed {removed}")
+            except sqlite3.Error as e:
+                logger.warning(f"Retention pass failed: {e}")
+            await asyncio.sleep(interval)
+    finally:
+        executor.shutdown(wait=False)
+
+
+def translations_get(source: str, target: str, hashes: List[str]) -> Dict[str, str]:
+    if not hashes:
+        return {}
+    conn = get_connection()
+    placeholders = ",".join("?" * len(hashes))
+    rows = conn.execute(
+        f"SELECT text_hash, translated FROM translations "
+        f"WHERE source = ? AND target = ? AND text_hash IN ({placeholders})",
+        [source, target] + list(hashes)
+    ).fetchall()
+    return {r["text_hash"]: r["translated"] for r in rows}
+
+
+def translations_put(source: str, target: str, rows: List[Tuple[str, str]]):
+    if not rows:
+        return
+    _writer.submit([
+        ("INSERT OR REPLACE INTO translations (source, target, text_hash, translated) VALUES (?, ?, ?, ?)",
+         (source, target, h, translated))
+        for h, translated in rows
+    ])
+
+
+# ─────────────────────────────────────────────────────────────
+# Ingested knowledge base
+# ─────────────────────────────────────────────────────────────
+
+def _kb_row_to_doc(row) -> Dict:
+    return {
+        "id": row["doc_id"],
+        "category": row["category"],
+        "subcategory": row["subcategory"],
+        "title": row["title"],
+        "content": row["content"],
+        "tags": json.loads(row["tags"] or "[]"),
+    }
+
+
+def kb_existing_hashes(hashes: List[str]) -> Set[str]:
+    if not hashes:
+        return set()
+    conn = get_connection()
+    placeholders = ",".join("?" * len(hashes))
+    rows = conn.execute(
+        f"SELECT content_hash FROM kb_documents WHERE deleted = 0 AND content_hash IN ({placeholders})",
+        hashes
+    ).fetchall()
+    return {r["content_hash"] for r in rows}
+
+
+def _kb_retire(conn, doc_ids: List[str], seq: int) -> int:
+    """Mark the live versions of doc_ids (and their passages) deleted at `seq`"""
+    placeholders = ",".join("?" * len(doc_ids))
+    conn.execute(
+        f"UPDATE kb_passages SET deleted = 1, embedding = NULL, seq = ? "
+        f"WHERE deleted = 0 AND document_id IN "
+        f"(SELECT id FROM kb_documents WHERE deleted = 0 AND doc_id IN ({placeholders}))",
+        [seq] + list(doc_ids)
+    )
+    cursor = conn.execute(
+        f"UPDATE kb_documents SET deleted = 1 WHERE deleted = 0 AND doc_id IN ({placeholders})",
+        list(doc_ids)
+    )
+    return cursor.rowcount
+
+
+def _kb_next_seq(conn) -> int:
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM kb_passages").fetchone()[0]
+
+
+def kb_write_batch(docs: List[Dict]) -> int:
+    """
+    Insert documents in one transaction. Each doc carries a content_hash and `passages`,
+    a list of (text, float32 embedding as bytes). A doc whose id already exists replaces
+    the old version. A doc whose content is already live (under any id) is skipped and
+    leaves the existing version in place. Returns documents added.
+    """
+    if not docs:
+        return 0
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        seq = _kb_next_seq(conn)
+        added = 0
+        for d in docs:
+            # Checked before retiring: idx_kb_documents_hash would otherwise make the insert
+            # a no-op after the old version of this id was already gone
+            if conn.execute(
+                "SELECT 1 FROM kb_documents WHERE deleted = 0 AND content_hash = ?", (d["content_hash"],)
+            ).fetchone():
+                continue
+            _kb_retire(conn, [d["id"]], seq)
+            cursor = conn.execute(
+                "INSERT INTO kb_documents "
+                "(doc_id, content_hash, title, content, category, subcategory, tags) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (d["id"], d["content_hash"], d["title"], d["content"], d["category"],
+                 d.get("subcategory", ""), json.dumps(d.get("tags", [])))
+            )
+            document_id = cursor.lastrowid
+            conn.executemany(
+                "INSERT INTO kb_passages (document_id, passage_no, text, embedding, seq) VALUES (?, ?, ?, ?, ?)",
+                [(document_id, n, text, emb, seq) for n, (text, emb) in enumerate(d["passages"])]
+            )
+            added += 1
+        conn.commit()
+        return added
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def kb_delete(doc_ids: List[str]) -> int:
+    if not doc_ids:
+        return 0
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        removed = _kb_retire(conn, doc_ids, _kb_next_seq(conn))
+        conn.commit()
+        return removed
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def kb_changes_since(seq: int, chunk_size: int = 1024) -> Iterator[List[Tuple[int, int, bool, bytes]]]:
+    """Stream passage (vector_id, seq, deleted, embedding) changes after `seq` in bounded chunks"""
+    cursor = get_connection().execute(
+        "SELECT vector_id, seq, deleted, embedding FROM kb_passages WHERE seq > ? ORDER BY seq, vector_id",
+        (seq,)
+    )
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield [(r["vector_id"], r["seq"], bool(r["deleted"]), r["embedding"]) for r in rows]
+    finally:
+        cursor.close()
+
+
+def kb_max_seq() -> int:
+    """Latest change applied to kb_passages (0 when nothing was ever ingested)"""
+    return _kb_next_seq(get_connection()) - 1
+
+
+def kb_live_vectors(max_seq: int, chunk_size: int = 4096) -> Tuple[int, Iterator[List[Tuple[int, bytes]]]]:
+    """
+    Passages live as of `max_seq`: their count, and their (vector_id, embedding) in
+    vector_id order in bounded chunks. Passages are never edited in place (a change
+    retires the row with a later seq), so this is the state at max_seq.
+    """
+    conn = get_connection()
+    count = conn.execute(
+        "SELECT COUNT(*) FROM kb_passages WHERE deleted = 0 AND seq <= ?", (max_seq,)
+    ).fetchone()[0]
+
+    def chunks():
+        cursor = conn.execute(
+            "SELECT vector_id, embedding FROM kb_passages WHERE deleted = 0 AND seq <= ? ORDER BY vector_id",
+            (max_seq,)
+        )
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [(r["vector_id"], r["embedding"]) for r in rows]
+        finally:
+            cursor.close()
+
+    return count, chunks()
+
+
+def kb_get_passages(vector_ids: List[int]) -> Dict[int, Dict]:
+    """Passage text and parent kb_documents.id per FAISS id"""
+    if not vector_ids:
+        return {}
+    conn = get_connection()
+    placeholders = ",".join("?" * len(vector_ids))
+    rows = conn.execute(
+        f"SELECT vector_id, document_id, passage_no, text FROM kb_passages WHERE vector_id IN ({placeholders})",
+        list(vector_ids)
+    ).fetchall()
+    return {r["vector_id"]: {"document": r["document_id"], "passage_no": r["passage_no"], "text": r["text"]} for r in rows}
+
+
+def kb_get_documents(document_ids: List[int]) -> Dict[int, Dict]:
+    if not document_ids:
+        return {}
+    conn = get_connection()
+    placeholders = ",".join("?" * len(document_ids))
+    rows = conn.execute(
+        f"SELECT * FROM kb_documents WHERE id IN ({placeholders})", list(document_ids)
+    ).fetchall()
+    return {r["id"]: _kb_row_to_doc(r) for r in rows}
+
+
+def kb_count() -> int:
+    conn = get_connection()
+    return conn.execute("SELECT COUNT(*) FROM kb_documents WHERE deleted = 0").fetchone()[0]
@@ -0,0 +1,94 @@
+"""
+KrishiSahay Document Store
+Read-only columnar storage for in-memory documents/passages: every text field lives
+in one UTF-8 buffer addressed by offsets, integer fields in typed arrays, and rows
+are handed out as lightweight mapping views instead of per-document dicts
+"""
+
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import Dict, Iterator, List, Tuple
+
+# Joins list fields (tags) inside the text buffer
+LIST_SEPARATOR = "\x1f"
+
+
+class RowView(Mapping):
+    """One row of a ColumnStore; decodes fields on access and is never copied"""
+
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: "ColumnStore", row: int):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, name: str):
+        return self._store.value(self._row, name)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._store.fields)
+
+    def __len__(self) -> int:
+        return len(self._store.fields)
+
+    def __repr__(self) -> str:
+        return f"RowView({dict(self)!r})"
+
+
+class ColumnStore(Sequence):
+    """
+    Rows of `text_fields` (str), `int_fields` (int) and `list_fields` (list of str).
+    A 10k-document KB costs one bytes object and a few arrays rather than 10k dicts
+    and their string objects.
+    """
+
+    def __init__(self, rows: List[Dict], text_fields: Tuple[str, ...],
+                 int_fields: Tuple[str, ...] = (), list_fields: Tuple[str, ...] = ()):
+        self.fields = tuple(text_fields) + tuple(list_fields) + tuple(int_fields)
+        self._list_fields = frozenset(list_fields)
+        self._text_columns = {name: i for i, name in enumerate(tuple(text_fields) + tuple(list_fields))}
+        self._width = len(self._text_columns)
+        self._ints = {name: array("q") for name in int_fields}
+
+        chunks = []
+        self._offsets = array("q", [0])
+        position = 0
+        for row in rows:
+            for name in self._text_columns:
+                value = row.get(name, "")
+                if name in self._list_fields:
+                    value = LIST_SEPARATOR.join(value or [])
+                encoded = str(value).encode("utf-8")
+                chunks.append(encoded)
+                position += len(encoded)
+                self._offsets.append(position)
+            for name, column in self._ints.items():
+                column.append(int(row.get(name, 0)))
+        self._buffer = b"".join(chunks)
+        self._length = len(rows)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, row: int) -> RowView:
+        if row < 0:
+            row += self._length
+        if not 0 <= row < self._length:
+            raise IndexError(row)
+        return RowView(self, row)
+
+    def value(self, row: int, name: str):
+        column = self._text_columns.get(name)
+        if column is None:
+            if name in self._ints:
+                return self._ints[name][row]
+            raise KeyError(name)
+        cell = row * self._width + column
+        text = self._buffer[self._offsets[cell]:self._offsets[cell + 1]].decode("utf-8")
+        if name in self._list_fields:
+            return text.split(LIST_SEPARATOR) if text else []
+        return text
+
+    def nbytes(self) -> int:
+        return (len(self._buffer) + self._offsets.itemsize * len(self._offsets)
+                + sum(c.itemsize * len(c) for c in self._ints.values()))
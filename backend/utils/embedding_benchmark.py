@@ -0,0 +1,148 @@
+"""
+KrishiSahay Embedding Benchmark
+Cold start, memory and CPU throughput of each embedding backend (utils.embeddings)
+
+    python -m utils.embeddings export                 # once, for the onnx backends
+    python -m utils.embedding_benchmark               # torch, onnx, onnx-int8
+    python -m utils.embedding_benchmark --backends torch,onnx-int8 --queries-file questions.txt
+
+Every backend runs in a fresh interpreter so import time and RSS aren't shared.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from pathlib import Path
+from typing import Dict, List
+
+from utils.warmup import WARMUP_QUERIES
+
+
+def _rss_mb() -> float:
+    """Resident set size of this process (Linux); 0 where /proc isn't available"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_backend(queries: List[str], batch_size: int, repeat: int, reference: str) -> Dict:
+    """Measured inside the child process, whose EMBEDDING_BACKEND selects the runtime"""
+    baseline_rss = _rss_mb()
+    started = time.perf_counter()
+    from utils import embeddings
+    import_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    embeddings.get_model()
+    load_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    embeddings.encode(queries[:1])
+    first_ms = (time.perf_counter() - started) * 1000
+
+    single = []
+    for _ in range(repeat):
+        for q in queries:
+            started = time.perf_counter()
+            embeddings.encode([q])
+            single.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for i in range(0, len(queries), batch_size):
+            embeddings.encode(queries[i:i + batch_size])
+    batch_qps = repeat * len(queries) / (time.perf_counter() - started)
+
+    if reference:
+        import numpy as np
+        np.save(reference, embeddings.encode(queries))
+
+    rss = _rss_mb()
+    return {
+        "backend": embeddings.EMBEDDING_BACKEND,
+        "import_s": import_s,
+        "load_s": load_s,
+        "first_ms": first_ms,
+        "p50_ms": _percentile(single, 0.5),
+        "p95_ms": _percentile(single, 0.95),
+        "batch_qps": batch_qps,
+        "rss_mb": rss,
+        "model_rss_mb": rss - baseline_rss,
+    }
+
+
+def _agreement(reference: Path, other: Path) -> float:
+    """Mean cosine between two backends' vectors for the same queries (both normalized)"""
+    import numpy as np
+    a, b = np.load(reference), np.load(other)
+    return float((a * b).sum(axis=1).mean())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding backend cold start / RSS / latency")
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8")
+    parser.add_argument("--queries-file", type=Path, help="one question per line")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=20, help="passes over the queries")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--vectors", default="", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    queries = WARMUP_QUERIES
+    if args.queries_file:
+        queries = [line.strip() for line in open(args.queries_file, encoding="utf-8") if line.strip()]
+
+    if args.child:
+        print(json.dumps(run_backend(queries, args.batch_size, args.repeat, args.vectors)))
+        return
+
+    rows = []
+    vector_files = {}
+    for backend in [b.strip() for b in args.backends.split(",")]:
+        vector_files[backend] = Path(f"/tmp/krishi_embedding_{backend}_{os.getpid()}.npy")
+        argv = [sys.executable, "-m", "utils.embedding_benchmark", "--child", backend,
+                "--batch-size", str(args.batch_size), "--repeat", str(args.repeat),
+                "--vectors", str(vector_files[backend])]
+        if args.queries_file:
+            argv += ["--queries-file", str(args.queries_file)]
+        started = time.perf_counter()
+        result = subprocess.run(argv, env={**os.environ, "EMBEDDING_BACKEND": backend},
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            error = result.stderr.strip().splitlines()
+            print(f"{backend}: failed ({error[-1] if error else result.returncode})")
+            continue
+        row = json.loads(result.stdout.strip().splitlines()[-1])
+        row["process_s"] = time.perf_counter() - started
+        rows.append(row)
+
+    if not rows:
+        return
+    reference = rows[0]["backend"]
+    print(f"queries={len(queries)} batch={args.batch_size} repeat={args.repeat} cpus={os.cpu_count()}")
+    print(f"{'backend':<10} {'process_s':>9} {'import_s':>8} {'load_s':>7} {'first_ms':>9} {'p50_ms':>7} {'p95_ms':>7} "
+          f"{'batch_qps':>10} {'rss_mb':>7} {'model_mb':>9} {'cos_vs_' + reference:>16}")
+    for r in rows:
+        cosine = _agreement(vector_files[reference], vector_files[r["backend"]])
+        print(f"{r['backend']:<10} {r['process_s']:>9.2f} {r['import_s']:>8.2f} {r['load_s']:>7.2f} {r['first_ms']:>9.1f} "
+              f"{r['p50_ms']:>7.2f} {r['p95_ms']:>7.2f} {r['batch_qps']:>10.0f} {r['rss_mb']:>7.0f} "
+              f"{r['model_rss_mb']:>9.0f} {cosine:>16.4f}")
+    for path in vector_files.values():
+        path.unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    main()
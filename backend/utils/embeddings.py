@@ -0,0 +1,212 @@
+"""
+KrishiSahay Embeddings
+Shared sentence-embedding model for the search and RAG indexes
+
+The runtime is only imported when the model is first loaded, so importing this module
+(and everything that depends on it) stays cheap:
+    torch      sentence-transformers on PyTorch (default)
+    onnx       the same transformer exported to ONNX Runtime, float32
+    onnx-int8  the ONNX export with dynamically quantized int8 weights
+
+Export the ONNX model files once (needs torch + onnxruntime):
+    python -m utils.embeddings export
+"""
+
+import os
+import logging
+import threading
+import importlib.util
+import numpy as np
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+ONNX_DIR = Path(os.getenv(
+    "EMBEDDING_ONNX_DIR",
+    Path(__file__).parent.parent / "data" / "onnx" / MODEL_NAME.replace("/", "__")
+))
+ONNX_FILE = "model.onnx"
+ONNX_INT8_FILE = "model_int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+MAX_SEQ_LENGTH = int(os.getenv("EMBEDDING_MAX_SEQ_LENGTH", "256"))
+
+# int8 vectors differ slightly from float32 ones, so persisted indexes are keyed by this
+MODEL_ID = f"{MODEL_NAME}@int8" if EMBEDDING_BACKEND == "onnx-int8" else MODEL_NAME
+
+# Modules each backend needs; checked without importing them
+BACKEND_REQUIREMENTS = {
+    "torch": ("sentence_transformers",),
+    "onnx": ("onnxruntime", "tokenizers"),
+    "onnx-int8": ("onnxruntime", "tokenizers"),
+}
+
+
+def backend_available(backend: str = EMBEDDING_BACKEND) -> bool:
+    """Whether the backend's runtime is installed, without paying for importing it"""
+    required = BACKEND_REQUIREMENTS.get(backend)
+    return required is not None and all(importlib.util.find_spec(m) is not None for m in required)
+
+
+# ─────────────────────────────────────────────────────────────
+# Backends
+# ─────────────────────────────────────────────────────────────
+
+class TorchEncoder:
+    """sentence-transformers model (transformer → mean pooling) on PyTorch"""
+
+    name = "torch"
+
+    def __init__(self, model_name: str = MODEL_NAME):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(texts, show_progress_bar=False), dtype=np.float32)
+
+    def set_num_threads(self, threads: int):
+        import torch
+        torch.set_num_threads(threads)
+
+
+class ONNXEncoder:
+    """
+    The exported transformer on ONNX Runtime with the same mean pooling. The session is
+    created on first encode in each process: ORT thread pools don't survive fork, so a
+    preloaded gunicorn master only shares the tokenizer and the (mmap'able) model file.
+    """
+
+    def __init__(self, model_dir: Path = ONNX_DIR, quantized: bool = False):
+        from tokenizers import Tokenizer
+        self.name = "onnx-int8" if quantized else "onnx"
+        self.path = model_dir / (ONNX_INT8_FILE if quantized else ONNX_FILE)
+        if not self.path.exists():
+            raise FileNotFoundError(f"{self.path} missing; run `python -m utils.embeddings export`")
+        self.tokenizer = Tokenizer.from_file(str(model_dir / TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+        self.threads = 0  # 0 lets ORT use every core
+        self._session = None
+        self._session_pid = None
+        self._inputs = ()
+        self._lock = threading.Lock()
+
+    def _get_session(self):
+        if self._session is None or self._session_pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._session_pid != os.getpid():
+                    import onnxruntime as ort
+                    options = ort.SessionOptions()
+                    options.intra_op_num_threads = self.threads
+                    options.inter_op_num_threads = 1
+                    self._session = ort.InferenceSession(str(self.path), options, providers=["CPUExecutionProvider"])
+                    self._inputs = tuple(i.name for i in self._session.get_inputs())
+                    self._session_pid = os.getpid()
+        return self._session
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        session = self._get_session()
+        batch = self.tokenizer.encode_batch(texts)
+        mask = np.array([e.attention_mask for e in batch], dtype=np.int64)
+        feeds = {
+            "input_ids": np.array([e.ids for e in batch], dtype=np.int64),
+            "attention_mask": mask,
+            "token_type_ids": np.array([e.type_ids for e in batch], dtype=np.int64),
+        }
+        hidden = session.run(None, {name: feeds[name] for name in self._inputs})[0]
+        weights = mask[:, :, None].astype(np.float32)
+        return (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+
+    def set_num_threads(self, threads: int):
+        # Takes effect for sessions created from now on, i.e. the one each worker makes after fork
+        self.threads = threads
+
+
+def load_encoder(backend: str = EMBEDDING_BACKEND):
+    if backend == "torch":
+        return TorchEncoder()
+    if backend in ("onnx", "onnx-int8"):
+        return ONNXEncoder(quantized=backend == "onnx-int8")
+    raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}' (torch, onnx, onnx-int8)")
+
+
+_model = None
+_model_lock = threading.Lock()
+_num_threads: Optional[int] = None
+
+
+def get_model():
+    """Load the embedding model once per process"""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                logger.info(f"Loading {EMBEDDING_BACKEND} embedding model {MODEL_NAME}...")
+                model = load_encoder()
+                if _num_threads is not None:
+                    model.set_num_threads(_num_threads)
+                _model = model
+    return _model
+
+
+def set_num_threads(threads: int):
+    """Intra-op threads for the embedding runtime (applied now, or when the model loads)"""
+    global _num_threads
+    _num_threads = threads
+    if _model is not None:
+        _model.set_num_threads(threads)
+
+
+def encode(texts: List[str]) -> np.ndarray:
+    """Encode texts into L2-normalized float32 vectors (cosine via inner product)"""
+    embeddings = get_model().encode(texts)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return embeddings / norms
+
+
+# ─────────────────────────────────────────────────────────────
+# ONNX export
+# ─────────────────────────────────────────────────────────────
+
+def export_onnx(model_dir: Path = ONNX_DIR, model_name: str = MODEL_NAME):
+    """Export the sentence-transformers transformer to ONNX, plus a dynamically quantized int8 copy"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self, transformer):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, *inputs):
+            return self.transformer(*inputs)[0]
+
+    st = SentenceTransformer(model_name, device="cpu")
+    transformer = st[0].auto_model.eval()
+    model_dir.mkdir(parents=True, exist_ok=True)
+    st.tokenizer.save_pretrained(str(model_dir))
+
+    sample = st.tokenizer(["how to control aphids on mustard"], return_tensors="pt")
+    # BertModel.forward takes these positionally in this order
+    names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    with torch.no_grad():
+        torch.onnx.export(
+            LastHiddenState(transformer), tuple(sample[n] for n in names), str(model_dir / ONNX_FILE),
+            input_names=names, output_names=["last_hidden_state"],
+            dynamic_axes={n: {0: "batch", 1: "sequence"} for n in names + ["last_hidden_state"]},
+            opset_version=14,
+        )
+    quantize_dynamic(str(model_dir / ONNX_FILE), str(model_dir / ONNX_INT8_FILE), weight_type=QuantType.QInt8)
+    print(f"Exported {model_name} to {model_dir / ONNX_FILE} and {model_dir / ONNX_INT8_FILE}")
+
+
+if __name__ == "__main__":
+    import sys
+    if sys.argv[1:] == ["export"]:
+        export_onnx()
+    else:
+        print("usage: python -m utils.embeddings export")
@@ -0,0 +1,263 @@
+"""
+KrishiSahay Index Store
+Persisted, versioned FAISS indexes so workers don't re-encode the KB on startup
+
+Layout of an index artifact (one directory per knowledge base):
+    manifest.json    format version, model name, KB content hash, doc ids + per-doc hashes
+    embeddings.npy   normalized float32 vectors, one row per doc (loaded with mmap)
+    index.faiss      FAISS index over those rows (loaded with mmap where supported)
+
+Prebuild before serving (e.g. in the Docker image):
+    python -m utils.index_store
+
+Segments (save_segment / load_segment) are artifacts over vectors that are already
+embedded, e.g. ingested passages, with an ids.npy mapping rows to caller ids.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import faiss
+import numpy as np
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils.embeddings import MODEL_ID, encode
+from utils.ann import build_ann_index, build_params, configure_search, rerank_index
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = Path(os.getenv("INDEX_DIR", Path(__file__).parent.parent / "data" / "index"))
+FORMAT_VERSION = 1
+
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+INDEX_FILE = "index.faiss"
+IDS_FILE = "ids.npy"
+
+
+def doc_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def kb_hash(doc_ids: List[str], doc_hashes: List[str]) -> str:
+    """Content hash of a whole knowledge base (ids, order, texts and model)"""
+    h = hashlib.sha256(f"{FORMAT_VERSION}:{MODEL_ID}".encode("utf-8"))
+    for doc_id, dh in zip(doc_ids, doc_hashes):
+        h.update(f"\n{doc_id}:{dh}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def content_version(docs: List[Dict], text_fn: Callable[[Dict], str]) -> str:
+    """KB hash for a doc list; changes whenever any indexed text changes"""
+    return kb_hash([d["id"] for d in docs], [doc_hash(text_fn(d)) for d in docs])
+
+
+def _read_manifest(path: Path) -> Optional[Dict]:
+    try:
+        with open(path / MANIFEST_FILE, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != FORMAT_VERSION or manifest.get("model") != MODEL_ID:
+            return None
+        return manifest
+    except (OSError, ValueError):
+        return None
+
+
+def _read_index(path: Path) -> faiss.Index:
+    try:
+        return faiss.read_index(str(path), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        # Older faiss builds only support mmap for some index types
+        return faiss.read_index(str(path))
+
+
+def _tmp(path: Path, filename: str) -> Path:
+    # Per process, so workers rebuilding at the same time never write into each other's files
+    return path / f"{filename}.{os.getpid()}.tmp"
+
+
+def _save_array(path: Path, filename: str, array: np.ndarray):
+    tmp = _tmp(path, filename)
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path / filename)
+
+
+def _save(path: Path, manifest: Dict, embeddings: np.ndarray, index: faiss.Index,
+          ids: Optional[np.ndarray] = None):
+    """Write the artifact; the manifest goes last so a partial write is never loaded"""
+    path.mkdir(parents=True, exist_ok=True)
+    _save_array(path, EMBEDDINGS_FILE, embeddings)
+    if ids is not None:
+        _save_array(path, IDS_FILE, ids)
+
+    tmp_index = _tmp(path, INDEX_FILE)
+    faiss.write_index(index, str(tmp_index))
+    os.replace(tmp_index, path / INDEX_FILE)
+
+    tmp_manifest = _tmp(path, MANIFEST_FILE)
+    with open(tmp_manifest, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_manifest, path / MANIFEST_FILE)
+
+
+def load_index(name: str, docs: List[Dict], text_fn: Callable[[Dict], str],
+               spec: Optional[Dict] = None) -> Tuple[faiss.Index, np.ndarray]:
+    """
+    Load the persisted index for a knowledge base, rebuilding it if the KB changed.
+    With compact vector storage (spec "storage") the returned index re-ranks its
+    candidates against the memory-mapped float32 embeddings.
+
+    Row i of the index and embeddings corresponds to docs[i]. When the content hash
+    differs from the stored one, only new or edited docs are re-embedded; when only
+    the index spec (see utils.ann) changed, the index is rebuilt from stored vectors.
+    """
+    path = INDEX_DIR / name
+    texts = [text_fn(d) for d in docs]
+    doc_ids = [d["id"] for d in docs]
+    doc_hashes = [doc_hash(t) for t in texts]
+    current_hash = kb_hash(doc_ids, doc_hashes)
+    params = build_params(spec)
+
+    embeddings = None
+    stale = []
+    manifest = _read_manifest(path)
+    if manifest and manifest.get("kb_hash") == current_hash:
+        try:
+            embeddings = np.load(path / EMBEDDINGS_FILE, mmap_mode="r")
+            if manifest.get("index") == params:
+                index = _read_index(path / INDEX_FILE)
+                if index.ntotal == len(docs):
+                    configure_search(index, spec)
+                    logger.info(f"✅ Loaded '{name}' {params['type']} index from disk ({index.ntotal} documents)")
+                    return rerank_index(index, embeddings, spec), embeddings
+        except (OSError, ValueError, RuntimeError) as e:
+            logger.warning(f"Stored '{name}' index unreadable, rebuilding: {e}")
+            embeddings = None
+
+    if embeddings is None:
+        # Reuse vectors of unchanged docs from the previous artifact
+        previous = {}
+        if manifest:
+            try:
+                old_embeddings = np.load(path / EMBEDDINGS_FILE, mmap_mode="r")
+                for row, key in enumerate(zip(manifest["doc_ids"], manifest["doc_hashes"])):
+                    previous[key] = old_embeddings[row]
+            except (OSError, ValueError, KeyError, IndexError):
+                previous = {}
+
+        stale = [i for i, key in enumerate(zip(doc_ids, doc_hashes)) if key not in previous]
+        fresh = encode([texts[i] for i in stale]) if stale else None
+
+        if fresh is not None:
+            dimension = fresh.shape[1]
+        elif previous:
+            dimension = len(next(iter(previous.values())))
+        else:
+            # Empty KB and nothing stored yet: ask the model for its vector size
+            dimension = encode(["dimension probe"]).shape[1]
+        embeddings = np.empty((len(docs), dimension), dtype=np.float32)
+        for i, key in enumerate(zip(doc_ids, doc_hashes)):
+            if key in previous:
+                embeddings[i] = previous[key]
+        if stale:
+            embeddings[stale] = fresh
+
+    index = build_ann_index(embeddings, spec)
+
+    _save(path, {
+        "version": FORMAT_VERSION,
+        "model": MODEL_ID,
+        "kb_hash": current_hash,
+        "index": params,
+        "doc_ids": doc_ids,
+        "doc_hashes": doc_hashes,
+    }, np.asarray(embeddings), index)
+    logger.info(f"✅ Built '{name}' {params['type']} index: {len(docs)} documents, {len(stale)} re-embedded")
+    # Serve from the mapped file rather than keeping the freshly built float32 copy resident
+    embeddings = np.load(path / EMBEDDINGS_FILE, mmap_mode="r")
+    return rerank_index(index, embeddings, spec), embeddings
+
+
+def save_segment(name: str, ids: np.ndarray, embeddings: np.ndarray, spec: Optional[Dict], seq: int):
+    """Build the configured ANN index over pre-computed vectors and persist it with their ids"""
+    params = build_params(spec)
+    index = build_ann_index(embeddings, spec)
+    path = INDEX_DIR / name
+    # Readers keep their current segment while there is no manifest, rather than
+    # pairing the old one with half-replaced files
+    try:
+        (path / MANIFEST_FILE).unlink()
+    except FileNotFoundError:
+        pass
+    _save(path, {
+        "version": FORMAT_VERSION,
+        "model": MODEL_ID,
+        "index": params,
+        "seq": seq,
+        "count": len(ids),
+    }, np.asarray(embeddings, dtype=np.float32), index, np.asarray(ids, dtype=np.int64))
+    logger.info(f"✅ Built '{name}' {params['type']} segment: {len(ids)} vectors up to seq {seq}")
+
+
+def segment_seq(name: str, spec: Optional[Dict] = None) -> int:
+    """seq the stored segment was built at (0 if there is none usable); reads only the manifest"""
+    manifest = _read_manifest(INDEX_DIR / name)
+    if not manifest or manifest.get("index") != build_params(spec):
+        return 0
+    return manifest.get("seq", 0)
+
+
+def load_segment(name: str, spec: Optional[Dict] = None) -> Optional[Tuple[faiss.Index, np.ndarray, int]]:
+    """
+    (index, ids, seq) of a stored segment, memory-mapped, or None if there is none, it
+    was built for another model / index spec, or it is mid-rewrite. Row i of the index
+    is ids[i].
+    """
+    path = INDEX_DIR / name
+    manifest = _read_manifest(path)
+    if not manifest or manifest.get("index") != build_params(spec):
+        return None
+    try:
+        embeddings = np.load(path / EMBEDDINGS_FILE, mmap_mode="r")
+        ids = np.load(path / IDS_FILE, mmap_mode="r")
+        index = _read_index(path / INDEX_FILE)
+    except (OSError, ValueError, RuntimeError) as e:
+        logger.warning(f"Stored '{name}' segment unreadable: {e}")
+        return None
+    if not index.ntotal == len(ids) == len(embeddings) == manifest.get("count"):
+        return None  # files from two different writes; the next attempt sees a consistent set
+    configure_search(index, spec)
+    return rerank_index(index, embeddings, spec), ids, manifest["seq"]
+
+
+def _targets() -> Dict[str, Tuple[List[Dict], Callable[[Dict], str], Optional[Dict]]]:
+    from main import KNOWLEDGE_BASE, KB_INDEX_NAME, kb_text, kb_index_spec
+    from utils.rag_engine import AGRICULTURAL_KNOWLEDGE, RAG_INDEX_NAME, passage_text, split_documents
+    from utils.ann import index_spec_from_env
+    return {
+        KB_INDEX_NAME: (KNOWLEDGE_BASE, kb_text, kb_index_spec()),
+        RAG_INDEX_NAME: (split_documents(AGRICULTURAL_KNOWLEDGE), passage_text, index_spec_from_env()),
+    }
+
+
+def main():
+    import argparse
+    targets = _targets()
+    parser = argparse.ArgumentParser(description="Prebuild KrishiSahay embedding indexes")
+    parser.add_argument("names", nargs="*", help=f"indexes to build: {', '.join(sorted(targets))} (default: all)")
+    args = parser.parse_args()
+    unknown = set(args.names) - set(targets)
+    if unknown:
+        parser.error(f"unknown index: {', '.join(sorted(unknown))}")
+    for name in args.names or sorted(targets):
+        docs, text_fn, spec = targets[name]
+        index, _ = load_index(name, docs, text_fn, spec)
+        print(f"{name}: {index.ntotal} vectors -> {INDEX_DIR / name}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,168 @@
+"""
+KrishiSahay KB Ingestion
+Streams JSONL/CSV documents into the knowledge base in bounded batches:
+normalize → dedupe by content hash → split into passages → embed → write to
+kb_documents / kb_passages.
+Serving workers pick the changes up through RAGEngine.sync_live(); at the end of a
+CLI run all ingested passages are rebuilt into the persisted segment (fold_ingested).
+
+    python -m utils.ingest kcc_transcripts.jsonl
+    python -m utils.ingest bulletins.csv --batch-size 512
+
+Each record needs `content` (or `answer` / `text`); optional `id`, `title`,
+`category`, `subcategory` and `tags` (list, or comma-separated in CSV).
+"""
+
+import os
+import csv
+import json
+import time
+import logging
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from utils.embeddings import encode
+from utils.index_store import doc_hash
+from utils.database import init_db, kb_existing_hashes, kb_write_batch, kb_delete
+from utils.chunking import split_passages
+from utils.rag_engine import AGRICULTURAL_KNOWLEDGE, doc_text, passage_text, fold_ingested
+
+logger = logging.getLogger(__name__)
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+
+
+def normalize_record(record: Dict) -> Optional[Dict]:
+    """Map a raw JSONL/CSV record onto the KB document shape; None if it has no text"""
+    content = (record.get("content") or record.get("answer") or record.get("text") or "").strip()
+    if not content:
+        return None
+    title = (record.get("title") or record.get("question") or content[:80]).strip()
+    tags = record.get("tags") or record.get("keywords") or []
+    if isinstance(tags, str):
+        tags = [t.strip() for t in tags.split(",") if t.strip()]
+
+    doc = {
+        "title": title,
+        "content": content,
+        "category": (record.get("category") or "general").strip(),
+        "subcategory": (record.get("subcategory") or "").strip(),
+        "tags": list(tags),
+    }
+    doc["content_hash"] = doc_hash(doc_text(doc))
+    doc["id"] = str(record.get("id") or f"doc_{doc['content_hash'][:16]}")
+    return doc
+
+
+def iter_jsonl(lines: Iterable[str]) -> Iterator[Dict]:
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            logger.warning(f"Skipping malformed JSON on line {line_no}")
+
+
+def iter_file(path: Path, fmt: Optional[str] = None) -> Iterator[Dict]:
+    """Lazily yield raw records from a .jsonl/.ndjson or .csv file"""
+    fmt = fmt or ("csv" if path.suffix.lower() == ".csv" else "jsonl")
+    with open(path, encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            yield from iter_jsonl(f)
+
+
+def batched(records: Iterable, size: int) -> Iterator[List]:
+    it = iter(records)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def builtin_hashes() -> set:
+    return {doc_hash(doc_text(d)) for d in AGRICULTURAL_KNOWLEDGE}
+
+
+def ingest_batch(records: List[Dict], skip_hashes: Optional[set] = None) -> Dict:
+    """Normalize, dedupe, chunk, embed and store one batch; only this batch is held in memory"""
+    docs: Dict[str, Dict] = {}
+    seen_hashes = set()
+    invalid = 0
+    for record in records:
+        doc = normalize_record(record)
+        if doc is None:
+            invalid += 1
+            continue
+        if doc["content_hash"] in seen_hashes:
+            continue
+        seen_hashes.add(doc["content_hash"])
+        docs[doc["id"]] = doc  # last version of a repeated id wins
+
+    existing = kb_existing_hashes(list(seen_hashes)) | (skip_hashes or set())
+    new_docs = [d for d in docs.values() if d["content_hash"] not in existing]
+
+    added = 0
+    if new_docs:
+        chunks = [split_passages(d["content"]) for d in new_docs]
+        embeddings = iter(encode([
+            passage_text({"title": d["title"], "text": text})
+            for d, texts in zip(new_docs, chunks) for text in texts
+        ]))
+        for doc, texts in zip(new_docs, chunks):
+            doc["passages"] = [(text, next(embeddings).tobytes()) for text in texts]
+        added = kb_write_batch(new_docs)
+
+    return {"records": len(records), "added": added, "duplicates": len(records) - invalid - added, "invalid": invalid}
+
+
+def ingest_records(records: Iterable[Dict], batch_size: int = INGEST_BATCH_SIZE, progress=None) -> Dict:
+    """Ingest a (possibly huge) record stream batch by batch"""
+    totals = {"records": 0, "added": 0, "duplicates": 0, "invalid": 0}
+    skip = builtin_hashes()
+    for chunk in batched(records, batch_size):
+        stats = ingest_batch(chunk, skip)
+        for key in totals:
+            totals[key] += stats[key]
+        if progress:
+            progress(totals)
+    return totals
+
+
+def delete_documents(doc_ids: List[str]) -> int:
+    return kb_delete(doc_ids)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Stream documents into the KrishiSahay knowledge base")
+    parser.add_argument("files", nargs="+", type=Path, help=".jsonl/.ndjson or .csv files")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="override detection by file extension")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    args = parser.parse_args()
+
+    init_db()
+    started = time.time()
+
+    def progress(t):
+        rate = t["records"] / max(time.time() - started, 1e-6)
+        print(f"\r{t['records']:,} records · {t['added']:,} added · {t['duplicates']:,} duplicates "
+              f"· {t['invalid']:,} invalid · {rate:,.0f}/s", end="", flush=True)
+
+    for path in args.files:
+        print(f"Ingesting {path}")
+        ingest_records(iter_file(path, args.format), args.batch_size, progress)
+        print()
+    if fold_ingested():
+        print("Rebuilt the ingested-passage index")
+    print(f"Done in {time.time() - started:.1f}s — running workers pick up changes within KB_SYNC_INTERVAL")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,159 @@
+"""
+KrishiSahay Language Detection
+Single pass over the text classifies it by Unicode script; only scripts shared by
+several supported languages (Devanagari: Hindi/Marathi, Latin: English/romanized
+Hindi) fall through to a small character-trigram model
+"""
+
+import math
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+# ─────────────────────────────────────────────────────────────
+# Script table
+# ─────────────────────────────────────────────────────────────
+
+OTHER, LATIN, DEVANAGARI, BENGALI, GURMUKHI, GUJARATI, ORIYA, TAMIL, TELUGU, KANNADA, MALAYALAM = range(11)
+
+# (first, last codepoint, script); marks and signs inside a block count for its script
+SCRIPT_RANGES = [
+    (0x0041, 0x005A, LATIN), (0x0061, 0x007A, LATIN),
+    (0x00C0, 0x024F, LATIN),
+    (0x0900, 0x097F, DEVANAGARI),
+    (0x0980, 0x09FF, BENGALI),
+    (0x0A00, 0x0A7F, GURMUKHI),
+    (0x0A80, 0x0AFF, GUJARATI),
+    (0x0B00, 0x0B7F, ORIYA),
+    (0x0B80, 0x0BFF, TAMIL),
+    (0x0C00, 0x0C7F, TELUGU),
+    (0x0C80, 0x0CFF, KANNADA),
+    (0x0D00, 0x0D7F, MALAYALAM),
+]
+
+# Script of every codepoint below TABLE_SIZE, so the scan is one index per character
+TABLE_SIZE = 0x0D80
+_SCRIPT_TABLE = bytearray(TABLE_SIZE)
+for _first, _last, _script in SCRIPT_RANGES:
+    _SCRIPT_TABLE[_first:_last + 1] = bytes([_script]) * (_last - _first + 1)
+# The danda and double danda are shared punctuation, not evidence for Hindi/Marathi
+_SCRIPT_TABLE[0x0964] = _SCRIPT_TABLE[0x0965] = OTHER
+
+# Scripts used by exactly one supported language
+SCRIPT_LANGUAGE = {
+    BENGALI: "bn", GURMUKHI: "pa", GUJARATI: "gu", ORIYA: "or",
+    TAMIL: "ta", TELUGU: "te", KANNADA: "kn", MALAYALAM: "ml",
+}
+
+# Latin letters per Indic letter above which mixed text (e.g. "गेहूं में NPK") still counts as Latin
+LATIN_DOMINANCE = 4
+
+
+def script_counts(text: str) -> List[int]:
+    counts = [0] * 11
+    table = _SCRIPT_TABLE
+    for ch in text:
+        cp = ord(ch)
+        if cp < TABLE_SIZE:
+            counts[table[cp]] += 1
+    return counts
+
+
+# ─────────────────────────────────────────────────────────────
+# Trigram model for shared scripts
+# ─────────────────────────────────────────────────────────────
+
+SEED_TEXT = {
+    "hi": """
+        मेरी गेहूं की फसल में पीले पत्ते क्यों हो रहे हैं? धान की खेती के लिए कौन सा खाद सबसे अच्छा है?
+        किसान क्रेडिट कार्ड के लिए आवेदन कैसे करें? टमाटर के पौधों में कीड़े लग गए हैं, क्या करना चाहिए?
+        सिंचाई के लिए ड्रिप सिस्टम पर सब्सिडी कितनी मिलती है? कपास में गुलाबी सुंडी का नियंत्रण कैसे करें?
+        यूरिया का छिड़काव कब और कितना करना चाहिए? मिट्टी की जांच कहां और कैसे करवाएं?
+        इस साल बारिश कम हुई है, कौन सी फसल लगाएं? प्रधानमंत्री किसान सम्मान निधि की किस्त नहीं आई है।
+        मेरे खेत में पानी भर गया है और पौधे सूख रहे हैं। बीज बोने से पहले उपचार करना जरूरी है।
+        फसल बीमा का दावा करने के लिए किससे संपर्क करें? मंडी में सही दाम कैसे मिलेगा?
+    """,
+    "mr": """
+        माझ्या गव्हाच्या पिकाची पाने पिवळी का होत आहेत? भात शेतीसाठी कोणते खत सर्वात चांगले आहे?
+        किसान क्रेडिट कार्डसाठी अर्ज कसा करायचा? टोमॅटोच्या झाडांवर कीड पडली आहे, काय करावे?
+        ठिबक सिंचनासाठी किती अनुदान मिळते? कापसातील गुलाबी बोंडअळीचे नियंत्रण कसे करावे?
+        युरियाची फवारणी केव्हा आणि किती करावी? मातीची तपासणी कुठे आणि कशी करावी?
+        यावर्षी पाऊस कमी झाला आहे, कोणते पीक घ्यावे? प्रधानमंत्री किसान सन्मान निधीचा हप्ता आला नाही.
+        माझ्या शेतात पाणी साचले आहे आणि रोपे सुकत आहेत. बियाणे पेरण्यापूर्वी बीजप्रक्रिया करणे आवश्यक आहे.
+        पीक विम्याचा दावा करण्यासाठी कोणाशी संपर्क साधावा? बाजारात योग्य भाव कसा मिळेल?
+    """,
+    "en": """
+        why are the leaves of my wheat crop turning yellow? which fertilizer is best for paddy cultivation?
+        how do i apply for a kisan credit card? insects have attacked my tomato plants, what should i do?
+        how much subsidy is available for a drip irrigation system? how to control pink bollworm in cotton?
+        when and how much urea should be sprayed? where can i get my soil tested?
+        rainfall was low this year, which crop should i grow? my pm kisan installment has not arrived.
+        my field is waterlogged and the plants are drying. seed treatment is necessary before sowing.
+        who should i contact to claim crop insurance? how can i get a good price in the market?
+        what is the best time to sow maize and what spacing should be used for hybrids?
+        tell me about government schemes for farmers and the documents needed to register.
+    """,
+    # Romanized Hindi, as typed on phones without an Indic keyboard
+    "hi_latn": """
+        meri gehu ki fasal mein peele patte kyon ho rahe hain? dhan ki kheti ke liye kaun sa khad sabse accha hai?
+        kisan credit card ke liye apply kaise kare? tamatar ke paudhon mein keede lag gaye hain, kya karna chahiye?
+        drip sinchai par subsidy kitni milti hai? kapas mein gulabi sundi ka niyantran kaise kare?
+        urea ka chidkav kab aur kitna karna chahiye? mitti ki jaanch kahan aur kaise karwayein?
+        is saal barish kam hui hai, kaun si fasal lagayen? pm kisan ki kist nahi aayi hai.
+        mere khet mein pani bhar gaya hai aur paudhe sookh rahe hain. beej bone se pehle upchar zaroori hai.
+        fasal bima ka dava karne ke liye kisse sampark karein? mandi mein sahi daam kaise milega?
+    """,
+}
+
+# Candidate languages per shared script, first is the default
+SCRIPT_CANDIDATES = {
+    DEVANAGARI: ("hi", "mr"),
+    LATIN: ("en", "hi_latn"),
+}
+# Log-likelihood lead (nats per trigram) the non-default language needs to win
+MARGIN = {DEVANAGARI: 0.0, LATIN: 0.5}
+# Words below which the default is kept: one or two Latin words are usually an English
+# query naming a crop ("jowar", "chana wilt"), and too few trigrams to tell apart
+MIN_WORDS = {DEVANAGARI: 1, LATIN: 3}
+
+
+def _trigrams(text: str) -> List[str]:
+    text = f" {' '.join(text.lower().split())} "
+    return [text[i:i + 3] for i in range(len(text) - 2)]
+
+
+def _build_profile(text: str) -> Tuple[Dict[str, float], float]:
+    counts = Counter(_trigrams(text))
+    total = sum(counts.values())
+    vocabulary = len(counts) + 1
+    unseen = math.log(1 / (total + vocabulary))
+    return {g: math.log((c + 1) / (total + vocabulary)) for g, c in counts.items()}, unseen
+
+
+PROFILES = {lang: _build_profile(text) for lang, text in SEED_TEXT.items()}
+
+
+@lru_cache(maxsize=4096)
+def _classify_shared(text: str, script: int) -> str:
+    grams = _trigrams(text)
+    if not grams or len(text.split()) < MIN_WORDS[script]:
+        return SCRIPT_CANDIDATES[script][0]
+    scores = []
+    for lang in SCRIPT_CANDIDATES[script]:
+        logp, unseen = PROFILES[lang]
+        scores.append(sum(logp.get(g, unseen) for g in grams) / len(grams))
+    default, other = SCRIPT_CANDIDATES[script]
+    return other if scores[1] - scores[0] > MARGIN[script] else default
+
+
+def detect_language(text: str) -> str:
+    """ISO 639-1 code of the query language ("en" when there is nothing to go on)"""
+    counts = script_counts(text)
+    indic = max(range(DEVANAGARI, MALAYALAM + 1), key=counts.__getitem__)
+    if counts[indic] and counts[indic] * LATIN_DOMINANCE >= counts[LATIN]:
+        if indic in SCRIPT_LANGUAGE:
+            return SCRIPT_LANGUAGE[indic]
+        return _classify_shared(text, indic)
+    if counts[LATIN]:
+        return _classify_shared(text, LATIN).split("_")[0]
+    return "en"
@@ -0,0 +1,116 @@
+"""
+KrishiSahay Language Detection Benchmark
+Accuracy and per-query latency of utils.language.detect_language on a labelled set
+
+    python -m utils.language_benchmark                  # built-in labelled queries
+    python -m utils.language_benchmark --file labelled.tsv   # lines of "<lang>\\t<text>"
+"""
+
+import time
+import argparse
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import List, Tuple
+
+from utils.language import detect_language
+
+# Held out from the trigram seed text in utils.language
+LABELLED = [
+    ("en", "How to control aphids on mustard?"),
+    ("en", "What is the MSP for wheat this year?"),
+    ("en", "PM-KISAN scheme details and how to apply"),
+    ("en", "Best fertilizer for sugarcane in black soil"),
+    ("en", "My cow is not eating, what should I do"),
+    ("en", "drip irrigation subsidy"),
+    ("en", "When should I harvest groundnut?"),
+    ("en", "Fall armyworm in maize treatment"),
+    # Short English and crop names borrowed from Hindi
+    ("en", "banana"),
+    ("en", "guava"),
+    ("en", "jowar"),
+    ("en", "Hi"),
+    ("en", "chana wilt"),
+    ("en", "bhindi pests"),
+    ("en", "chana wilt control"),
+    ("en", "mandi bhav today"),
+    ("en", "pm kisan status"),
+    ("hi", "सरसों में माहू कीट का नियंत्रण कैसे करें?"),
+    ("hi", "इस साल गेहूं का समर्थन मूल्य क्या है?"),
+    ("hi", "गन्ने के लिए काली मिट्टी में कौन सी खाद डालें?"),
+    ("hi", "मूंगफली की खुदाई कब करनी चाहिए?"),
+    ("hi", "मक्का में फॉल आर्मीवर्म का इलाज बताइए"),
+    ("hi", "गेहूं में NPK कितना डालें?"),
+    ("hi", "pm kisan ka paisa kab aayega"),
+    ("hi", "sarson mein mahu keet ka ilaj batao"),
+    ("hi", "pyaz ka bhav"),
+    ("hi", "gobhi mein keede"),
+    ("mr", "मोहरीवरील मावा किडीचे नियंत्रण कसे करावे?"),
+    ("mr", "यंदा गव्हाचा हमीभाव किती आहे?"),
+    ("mr", "उसासाठी काळ्या जमिनीत कोणते खत द्यावे?"),
+    ("mr", "भुईमुगाची काढणी केव्हा करावी?"),
+    ("mr", "मक्यावरील लष्करी अळीवर उपाय सांगा"),
+    ("bn", "সরিষায় জাব পোকা দমন কীভাবে করব?"),
+    ("bn", "ধানের জন্য কোন সার সবচেয়ে ভালো?"),
+    ("pa", "ਕਣਕ ਦੀ ਫਸਲ ਵਿੱਚ ਪੀਲੀ ਕੁੰਗੀ ਦਾ ਇਲਾਜ ਕੀ ਹੈ?"),
+    ("pa", "ਝੋਨੇ ਲਈ ਕਿਹੜੀ ਖਾਦ ਵਧੀਆ ਹੈ?"),
+    ("gu", "કપાસમાં ગુલાબી ઈયળનું નિયંત્રણ કેવી રીતે કરવું?"),
+    ("gu", "મગફળી ક્યારે કાઢવી જોઈએ?"),
+    ("ta", "நெல் பயிருக்கு எந்த உரம் சிறந்தது?"),
+    ("ta", "தக்காளியில் இலைச் சுருள் நோய்க்கு என்ன செய்வது?"),
+    ("te", "వరి పంటకు ఏ ఎరువు మంచిది?"),
+    ("te", "పత్తిలో గులాబీ రంగు పురుగు నివారణ ఎలా?"),
+    ("kn", "ಭತ್ತದ ಬೆಳೆಗೆ ಯಾವ ಗೊಬ್ಬರ ಉತ್ತಮ?"),
+    ("kn", "ಟೊಮೆಟೊ ಗಿಡಗಳಿಗೆ ರೋಗ ಬಂದಿದೆ ಏನು ಮಾಡಬೇಕು?"),
+    ("ml", "നെല്ലിന് ഏത് വളമാണ് നല്ലത്?"),
+    ("ml", "തെങ്ങിന് കീടബാധ എങ്ങനെ തടയാം?"),
+]
+
+
+def load_labelled(path: Path) -> List[Tuple[str, str]]:
+    rows = []
+    for line in open(path, encoding="utf-8"):
+        if "\t" in line:
+            lang, text = line.rstrip("\n").split("\t", 1)
+            rows.append((lang.strip(), text))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Language detection accuracy and latency")
+    parser.add_argument("--file", type=Path, help='labelled set, one "<lang>\\t<text>" per line')
+    parser.add_argument("--repeat", type=int, default=1000, help="timing passes over the set")
+    args = parser.parse_args()
+
+    labelled = load_labelled(args.file) if args.file else LABELLED
+
+    per_lang = defaultdict(Counter)
+    errors = []
+    for lang, text in labelled:
+        predicted = detect_language(text)
+        per_lang[lang]["total"] += 1
+        if predicted == lang:
+            per_lang[lang]["correct"] += 1
+        else:
+            errors.append((lang, predicted, text))
+
+    # Time the uncached path: the trigram model's cache would otherwise hide its cost
+    from utils.language import _classify_shared
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        _classify_shared.cache_clear()
+        for _, text in labelled:
+            detect_language(text)
+    per_query_us = (time.perf_counter() - started) / (args.repeat * len(labelled)) * 1e6
+
+    correct = sum(c["correct"] for c in per_lang.values())
+    print(f"{'lang':<6} {'correct':>8} {'total':>6} {'accuracy':>9}")
+    for lang in sorted(per_lang):
+        c = per_lang[lang]
+        print(f"{lang:<6} {c['correct']:>8} {c['total']:>6} {c['correct'] / c['total']:>9.3f}")
+    print(f"overall accuracy {correct / len(labelled):.3f} on {len(labelled)} queries · {per_query_us:.1f} µs/query (uncached)")
+    for lang, predicted, text in errors:
+        print(f"  expected {lang}, got {predicted}: {text}")
+
+
+if __name__ == "__main__":
+    main()
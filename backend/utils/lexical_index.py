@@ -0,0 +1,87 @@
+"""
+KrishiSahay Lexical Index
+Precomputed inverted index with BM25 scoring for keyword search
+"""
+
+import re
+import math
+import heapq
+from bisect import bisect_left
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Word characters plus the Indic script blocks (their vowel signs aren't \w)
+_TOKEN = re.compile(r"[\w\u0900-\u0DFF]+")
+
+MIN_TOKEN_LEN = 2
+# Query terms at least this long also match vocabulary terms they are a prefix of
+MIN_PREFIX_LEN = 3
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if len(t) >= MIN_TOKEN_LEN]
+
+
+class BM25Index:
+    """
+    BM25 over a body field plus a boosted keyword field. Built once per KB version;
+    queries only touch the postings of their own terms.
+    """
+
+    def __init__(self, docs: List[Dict], text_fn: Callable[[Dict], str],
+                 keywords_fn: Optional[Callable[[Dict], Iterable[str]]] = None,
+                 keyword_weight: float = 2.0, k1: float = 1.5, b: float = 0.75):
+        self.docs = docs
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, float]]] = {}
+        self.doc_len: List[int] = []
+
+        for i, doc in enumerate(docs):
+            body = tokenize(text_fn(doc))
+            tf = Counter(body)
+            if keywords_fn:
+                for kw in keywords_fn(doc):
+                    for t in tokenize(kw):
+                        tf[t] += keyword_weight
+            self.doc_len.append(len(body))
+            for term, freq in tf.items():
+                self.postings.setdefault(term, []).append((i, freq))
+
+        n = len(docs)
+        self.avg_len = (sum(self.doc_len) / n) if n else 0.0
+        self.idf = {
+            term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))
+            for term, p in self.postings.items()
+        }
+        self.vocabulary = sorted(self.postings)
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def _expand(self, term: str) -> List[str]:
+        """The term itself plus vocabulary terms it prefixes (e.g. 'fert' → 'fertilizer')"""
+        if len(term) < MIN_PREFIX_LEN:
+            return [term] if term in self.postings else []
+        matches = []
+        i = bisect_left(self.vocabulary, term)
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(term):
+            matches.append(self.vocabulary[i])
+            i += 1
+        return matches
+
+    def scores(self, query: str) -> Dict[int, float]:
+        """BM25 score per matching doc index"""
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            for match in self._expand(term):
+                idf = self.idf[match]
+                for doc_idx, tf in self.postings[match]:
+                    norm = 1 - self.b + self.b * (self.doc_len[doc_idx] / self.avg_len if self.avg_len else 0)
+                    scores[doc_idx] = scores.get(doc_idx, 0.0) + idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        return scores
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[float, int]]:
+        """Top-k (score, doc index) pairs, best first"""
+        scores = self.scores(query)
+        return heapq.nlargest(top_k, ((s, i) for i, s in scores.items() if s > 0))
@@ -5,9 +5,14 @@ Supports IBM Watson ML + Ollama (LLaMA 3) fallback + rule-based fallback
 
 import os
 import json
+import time
+import asyncio
 import logging
 import httpx
-from typing import Optional
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional
+
+from utils.llm_router import Backend, BackendRouter
+from utils.metrics import span
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +22,17 @@ IBM_REGION = os.getenv("IBM_REGION", "us-south")
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
 
+IBM_IAM_URL = "https://iam.cloud.ibm.com/identity/token"
+IBM_MODEL_ID = "ibm/granite-13b-instruct-v2"
+WATSON_TIMEOUT = 30
+OLLAMA_TIMEOUT = 60
+
+# Pooled HTTP client shared by all LLM backends (started/stopped with the app lifespan)
+HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20"))
+# Refresh IAM tokens this many seconds before they expire
+IAM_REFRESH_MARGIN = int(os.getenv("IBM_IAM_REFRESH_MARGIN", "300"))
+
 SYSTEM_PROMPT = """You are KrishiSahay, an expert agricultural advisor helping Indian farmers.
 You have deep knowledge of crops, pests, fertilizers, irrigation, and government schemes.
 
@@ -34,6 +50,79 @@ Rules:
 IMPORTANT: Do not answer non-agricultural questions. Politely redirect to farming topics."""
 
 
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared connection-pooled client; created on first use if the lifespan didn't start it"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(OLLAMA_TIMEOUT, connect=10),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            ),
+        )
+    return _http_client
+
+
+async def start_http_client():
+    get_http_client()
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+class IAMTokenCache:
+    """Caches the IBM IAM bearer token and refreshes it shortly before expiry"""
+
+    def __init__(self, api_key: str, refresh_margin: int = IAM_REFRESH_MARGIN):
+        self.api_key = api_key
+        self.refresh_margin = refresh_margin
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _valid(self) -> bool:
+        return self._token is not None and time.time() < self._expires_at - self.refresh_margin
+
+    async def get_token(self) -> Optional[str]:
+        if self._valid():
+            return self._token
+        # Only one coroutine refreshes; the others wait and reuse its token
+        async with self._lock:
+            if self._valid():
+                return self._token
+            resp = await get_http_client().post(
+                IBM_IAM_URL,
+                data={
+                    "grant_type": "urn:ibm:params:oauth:grant-type:apikey",
+                    "apikey": self.api_key
+                },
+                headers={"Content-Type": "application/x-www-form-urlencoded"},
+                timeout=WATSON_TIMEOUT
+            )
+            data = resp.json()
+            token = data.get("access_token")
+            if not token:
+                return None
+            expires_at = data.get("expiration") or time.time() + data.get("expires_in", 3600)
+            self._token, self._expires_at = token, float(expires_at)
+            return token
+
+    def invalidate(self):
+        self._token = None
+        self._expires_at = 0.0
+
+
+_iam_tokens = IAMTokenCache(IBM_API_KEY)
+
+
 def build_prompt(query: str, context: str, language: str = "en") -> str:
     lang_instruction = ""
     if language != "en":
@@ -59,52 +148,97 @@ Please provide a helpful, practical answer for the farmer.{lang_instruction}"""
 Please provide a helpful, practical agricultural answer.{lang_instruction}"""
 
 
-async def call_ibm_watson(query: str, context: str, language: str = "en") -> Optional[str]:
-    """Call IBM Watson Machine Learning API"""
+async def watson_generate(prompt: str, parameters: Dict) -> Optional[str]:
+    """Run a Watson ML text generation with a cached IAM token over the pooled client"""
     if not IBM_API_KEY or not IBM_PROJECT_ID:
         return None
 
-    try:
-        # Get IAM token
-        async with httpx.AsyncClient(timeout=30) as client:
-            token_resp = await client.post(
-                "https://iam.cloud.ibm.com/identity/token",
-                data={
-                    "grant_type": "urn:ibm:params:oauth:grant-type:apikey",
-                    "apikey": IBM_API_KEY
-                },
-                headers={"Content-Type": "application/x-www-form-urlencoded"}
-            )
-            token = token_resp.json().get("access_token")
+    url = f"https://{IBM_REGION}.ml.cloud.ibm.com/ml/v1/text/generation?version=2023-05-29"
+    payload = {
+        "model_id": IBM_MODEL_ID,
+        "input": prompt,
+        "parameters": parameters,
+        "project_id": IBM_PROJECT_ID
+    }
+
+    with span("llm_watson"):
+        for attempt in range(2):
+            token = await _iam_tokens.get_token()
             if not token:
                 return None
-
-            # Call generation endpoint
-            url = f"https://{IBM_REGION}.ml.cloud.ibm.com/ml/v1/text/generation?version=2023-05-29"
-            payload = {
-                "model_id": "ibm/granite-13b-instruct-v2",
-                "input": build_prompt(query, context, language),
-                "parameters": {
-                    "decoding_method": "greedy",
-                    "max_new_tokens": 400,
-                    "min_new_tokens": 50,
-                    "temperature": 0.7,
-                    "top_p": 0.9,
-                    "stop_sequences": ["\n\n\n"]
-                },
-                "project_id": IBM_PROJECT_ID
-            }
-
-            resp = await client.post(
+            resp = await get_http_client().post(
                 url,
                 json=payload,
-                headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+                headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+                timeout=WATSON_TIMEOUT
             )
+            if resp.status_code == 401 and attempt == 0:
+                # Token revoked or expired early — refresh once and retry
+                _iam_tokens.invalidate()
+                continue
             result = resp.json()
-            generated = result.get("results", [{}])[0].get("generated_text", "").strip()
-            if generated:
-                logger.info("✅ IBM Watson response received")
-                return generated
+            return result.get("results", [{}])[0].get("generated_text", "").strip() or None
+    return None
+
+
+async def watson_generate_stream(prompt: str, parameters: Dict) -> AsyncIterator[str]:
+    """Stream Watson ML generated text chunks from the SSE generation_stream endpoint"""
+    if not IBM_API_KEY or not IBM_PROJECT_ID:
+        return
+
+    url = f"https://{IBM_REGION}.ml.cloud.ibm.com/ml/v1/text/generation_stream?version=2023-05-29"
+    payload = {
+        "model_id": IBM_MODEL_ID,
+        "input": prompt,
+        "parameters": parameters,
+        "project_id": IBM_PROJECT_ID
+    }
+
+    for attempt in range(2):
+        token = await _iam_tokens.get_token()
+        if not token:
+            return
+        async with get_http_client().stream(
+            "POST",
+            url,
+            json=payload,
+            headers={"Authorization": f"Bearer {token}", "Accept": "text/event-stream"},
+            timeout=WATSON_TIMEOUT
+        ) as resp:
+            if resp.status_code == 401 and attempt == 0:
+                _iam_tokens.invalidate()
+                continue
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if not data:
+                    continue
+                results = json.loads(data).get("results") or [{}]
+                text = results[0].get("generated_text", "")
+                if text:
+                    yield text
+            return
+
+
+WATSON_PARAMETERS = {
+    "decoding_method": "greedy",
+    "max_new_tokens": 400,
+    "min_new_tokens": 50,
+    "temperature": 0.7,
+    "top_p": 0.9,
+    "stop_sequences": ["\n\n\n"]
+}
+
+
+async def call_ibm_watson(query: str, context: str, language: str = "en") -> Optional[str]:
+    """Call IBM Watson Machine Learning API"""
+    try:
+        generated = await watson_generate(build_prompt(query, context, language), WATSON_PARAMETERS)
+        if generated:
+            logger.info("✅ IBM Watson response received")
+            return generated
 
     except Exception as e:
         logger.warning(f"IBM Watson call failed: {e}")
@@ -112,30 +246,54 @@ async def call_ibm_watson(query: str, context: str, language: str = "en") -> Opt
     return None
 
 
+def _ollama_payload(query: str, context: str, language: str, stream: bool) -> Dict:
+    return {
+        "model": OLLAMA_MODEL,
+        "system": SYSTEM_PROMPT,
+        "prompt": build_prompt(query, context, language),
+        "stream": stream,
+        "options": {"temperature": 0.7, "num_predict": 400}
+    }
+
+
 async def call_ollama(query: str, context: str, language: str = "en") -> Optional[str]:
     """Call local Ollama instance"""
     try:
-        async with httpx.AsyncClient(timeout=60) as client:
-            resp = await client.post(
+        with span("llm_ollama"):
+            resp = await get_http_client().post(
                 f"{OLLAMA_URL}/api/generate",
-                json={
-                    "model": OLLAMA_MODEL,
-                    "system": SYSTEM_PROMPT,
-                    "prompt": build_prompt(query, context, language),
-                    "stream": False,
-                    "options": {"temperature": 0.7, "num_predict": 400}
-                }
+                json=_ollama_payload(query, context, language, stream=False),
+                timeout=OLLAMA_TIMEOUT
             )
             result = resp.json()
-            answer = result.get("response", "").strip()
-            if answer:
-                logger.info("✅ Ollama response received")
-                return answer
+        answer = result.get("response", "").strip()
+        if answer:
+            logger.info("✅ Ollama response received")
+            return answer
     except Exception as e:
         logger.warning(f"Ollama call failed: {e}")
     return None
 
 
+async def stream_ollama(query: str, context: str, language: str = "en") -> AsyncIterator[str]:
+    """Stream tokens from Ollama's NDJSON /api/generate response"""
+    async with get_http_client().stream(
+        "POST",
+        f"{OLLAMA_URL}/api/generate",
+        json=_ollama_payload(query, context, language, stream=True),
+        timeout=OLLAMA_TIMEOUT
+    ) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if not line.strip():
+                continue
+            chunk = json.loads(line)
+            if chunk.get("response"):
+                yield chunk["response"]
+            if chunk.get("done"):
+                return
+
+
 def rule_based_answer(query: str, context: str) -> str:
     """Smart rule-based fallback using retrieved context"""
     if not context:
@@ -162,19 +320,76 @@ def rule_based_answer(query: str, context: str) -> str:
     )
 
 
-async def generate_answer(query: str, context: str, language: str = "en") -> str:
-    """Main answer generation — tries IBM Watson → Ollama → Rule-based"""
+RULE_BASED = "rule_based"
+
+
+class Answer(NamedTuple):
+    text: str
+    method: str  # backend that answered ("ibm_watson", "ollama") or RULE_BASED
+
+    @property
+    def from_llm(self) -> bool:
+        return self.method != RULE_BASED
+
 
-    # Try IBM Watson first
-    answer = await call_ibm_watson(query, context, language)
-    if answer:
-        return answer
+def _configured_backends() -> List[Backend]:
+    """Backends in priority order; Watson without credentials is left out rather than failing every call"""
+    backends = []
+    if IBM_API_KEY and IBM_PROJECT_ID:
+        backends.append(Backend("ibm_watson", call_ibm_watson))
+    backends.append(Backend("ollama", call_ollama))
+    return backends
 
-    # Try Ollama
-    answer = await call_ollama(query, context, language)
-    if answer:
-        return answer
+
+_backends = BackendRouter(_configured_backends())
+
+
+def backend_stats() -> Dict:
+    return _backends.stats()
+
+
+async def generate_answer(query: str, context: str, language: str = "en") -> Answer:
+    """Main answer generation — IBM Watson → Ollama (hedged, within LLM_DEADLINE) → Rule-based"""
+    with span("llm"):
+        answered = await _backends.run(query, context, language)
+    if answered:
+        method, text = answered
+        return Answer(text, method)
 
     # Fallback to rule-based
     logger.info("Using rule-based fallback")
-    return rule_based_answer(query, context)
+    return Answer(rule_based_answer(query, context), RULE_BASED)
+
+
+async def stream_llm(query: str, context: str, language: str = "en") -> AsyncIterator[str]:
+    """
+    Stream tokens from IBM Watson → Ollama. A backend that fails before its first
+    token falls through to the next; yields nothing if neither is reachable. A failure
+    after the first token is re-raised, since the answer streamed so far is incomplete.
+    """
+    streams = [
+        ("ibm_watson", lambda: watson_generate_stream(build_prompt(query, context, language), WATSON_PARAMETERS)),
+        ("ollama", lambda: stream_ollama(query, context, language)),
+    ]
+    for name, open_stream in streams:
+        backend = _backends.get(name)
+        if backend is None or not backend.breaker.allow():
+            continue
+        started = False
+        try:
+            async for token in open_stream():
+                if not started:
+                    started = True
+                    backend.breaker.record_success()
+                yield token
+        except asyncio.CancelledError:
+            backend.breaker.release()
+            raise
+        except Exception as e:
+            logger.warning(f"{name} stream failed: {e}")
+            if started:
+                backend.breaker.record_failure()
+                raise
+        if started:
+            return
+        backend.breaker.record_failure()
@@ -0,0 +1,197 @@
+"""
+KrishiSahay LLM Backend Router
+Latency tracking, circuit breakers and hedged requests across LLM backends
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Total time before the caller falls back to the rule-based answer
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "45"))
+# Start the next backend if the current one hasn't answered within its p95
+LLM_HEDGING = os.getenv("LLM_HEDGING", "true").lower() in ("1", "true", "yes")
+HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "8"))
+HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1"))
+HEDGE_MIN_SAMPLES = 20
+# Open the circuit after this many consecutive failures, retry after the cooldown
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+EWMA_ALPHA = 0.2
+LATENCY_WINDOW = 200
+
+
+class CircuitBreaker:
+    """closed → open after N consecutive failures → half-open (one trial) after cooldown"""
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_running or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._trial_running = False
+
+    def release(self):
+        """A trial call was cancelled without an outcome"""
+        self._trial_running = False
+
+
+class Backend:
+    """One LLM backend: an async call returning text or None, plus its latency stats"""
+
+    def __init__(self, name: str, call: Callable[..., Awaitable[Optional[str]]]):
+        self.name = name
+        self.call = call
+        self.breaker = CircuitBreaker()
+        self.ewma: Optional[float] = None
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.successes = 0
+        self.errors = 0
+        self.hedges = 0
+
+    def record(self, latency: float, ok: bool):
+        if ok:
+            self.successes += 1
+            self.latencies.append(latency)
+            self.ewma = latency if self.ewma is None else EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.ewma
+            self.breaker.record_success()
+        else:
+            self.errors += 1
+            self.breaker.record_failure()
+
+    def p95(self) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def hedge_delay(self) -> float:
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        return max(HEDGE_MIN_DELAY, self.p95())
+
+    def stats(self) -> Dict:
+        p95 = self.p95()
+        return {
+            "state": self.breaker.state,
+            "successes": self.successes,
+            "errors": self.errors,
+            "hedged": self.hedges,
+            "ewma_ms": round(self.ewma * 1000) if self.ewma is not None else None,
+            "p95_ms": round(p95 * 1000) if p95 is not None else None,
+        }
+
+
+class BackendRouter:
+    """
+    Tries backends in priority order within one deadline. A backend that fails
+    hands over immediately; one that is slower than its p95 gets the next backend
+    started alongside it (hedging) and the first usable answer wins.
+    """
+
+    def __init__(self, backends: List[Backend], deadline: float = LLM_DEADLINE, hedging: bool = LLM_HEDGING):
+        self.backends = backends
+        self.deadline = deadline
+        self.hedging = hedging
+
+    def get(self, name: str) -> Optional[Backend]:
+        return next((b for b in self.backends if b.name == name), None)
+
+    async def _timed(self, backend: Backend, *args) -> Optional[str]:
+        started = time.monotonic()
+        try:
+            result = await backend.call(*args)
+        except asyncio.CancelledError:
+            backend.breaker.release()
+            raise
+        except Exception as e:
+            logger.warning(f"{backend.name} failed: {e}")
+            result = None
+        backend.record(time.monotonic() - started, bool(result))
+        return result
+
+    async def run(self, *args) -> Optional[Tuple[str, str]]:
+        """(backend name, answer) from the first backend that answers, or None"""
+        loop = asyncio.get_running_loop()
+        deadline_at = loop.time() + self.deadline
+        waiting = [b for b in self.backends]
+        running: Dict[asyncio.Task, Backend] = {}
+
+        def start_next(hedge: bool = False) -> bool:
+            while waiting:
+                backend = waiting.pop(0)
+                if backend.breaker.allow():
+                    if hedge:
+                        backend.hedges += 1
+                        logger.info(f"Hedging with {backend.name}")
+                    running[asyncio.create_task(self._timed(backend, *args))] = backend
+                    return True
+            return False
+
+        try:
+            start_next()
+            while running:
+                remaining = deadline_at - loop.time()
+                if remaining <= 0:
+                    logger.warning(f"LLM deadline of {self.deadline}s exceeded")
+                    for backend in running.values():
+                        backend.record(self.deadline, ok=False)
+                    return None
+                timeout = remaining
+                if self.hedging and waiting:
+                    newest = list(running.values())[-1]
+                    timeout = min(remaining, newest.hedge_delay())
+
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    backend = running.pop(task)
+                    result = task.result()
+                    if result:
+                        return backend.name, result
+
+                if done and not running:
+                    # Everything in flight failed — go straight to the next backend
+                    start_next()
+                elif not done and self.hedging:
+                    start_next(hedge=True)
+            return None
+        finally:
+            for task in running:
+                task.cancel()
+
+    def stats(self) -> Dict:
+        return {b.name: b.stats() for b in self.backends}
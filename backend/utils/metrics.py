@@ -0,0 +1,234 @@
+"""
+KrishiSahay Metrics
+Per-stage latency histograms for the query pipeline, exported in Prometheus text
+format, plus an optional Server-Timing header with the current request's stages
+
+    with span("faiss_search"):
+        index.search(...)
+
+Spans are cheap (two perf_counter calls, a bisect and a lock), so they stay on in
+production. Stages timed on executor threads land in the histograms only; stages
+timed in the request's own task are also reported in its Server-Timing header.
+
+Histograms live in each process. With METRICS_DIR set (gunicorn.conf.py does), every
+worker also writes a snapshot of its own there about once a second, and /metrics,
+whichever worker answers it, reports the sum over all of them. Snapshots of exited
+workers are kept, so the totals only ever grow while the server runs.
+"""
+
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the histogram buckets; +Inf is implicit
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() == "true"
+METRIC_PREFIX = "krishisahay"
+# Shared by all workers of one server; empty keeps the histograms per process
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "1"))
+
+
+class StageHistogram:
+    __slots__ = ("counts", "total", "count", "errors", "_lock")
+
+    def __init__(self):
+        self.counts = [0] * (len(STAGE_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, error: bool = False):
+        slot = bisect_left(STAGE_BUCKETS, seconds)
+        with self._lock:
+            self.counts[slot] += 1
+            self.total += seconds
+            self.count += 1
+            self.errors += error
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {"counts": list(self.counts), "total": self.total, "count": self.count, "errors": self.errors}
+
+
+_stages: Dict[str, StageHistogram] = {}
+_stages_lock = threading.Lock()
+
+# Stage durations (ms) of the request being served, when Server-Timing is on
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def _histogram(stage: str) -> StageHistogram:
+    histogram = _stages.get(stage)
+    if histogram is None:
+        with _stages_lock:
+            histogram = _stages.setdefault(stage, StageHistogram())
+    return histogram
+
+
+def observe(stage: str, seconds: float, error: bool = False):
+    _histogram(stage).observe(seconds, error)
+    if METRICS_DIR and _flusher is None:
+        _start_flusher()
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds * 1000
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a block (sync, or async code between awaits) as one observation of `stage`"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        observe(stage, time.perf_counter() - started, error=True)
+        raise
+    # Cancellation (e.g. the losing side of a hedged LLM call) isn't observed at all
+    observe(stage, time.perf_counter() - started)
+
+
+# ─────────────────────────────────────────────────────────────
+# Sharing across workers
+# ─────────────────────────────────────────────────────────────
+
+_flusher: Optional[threading.Thread] = None
+_flusher_lock = threading.Lock()
+
+
+def _snapshot() -> Dict[str, Dict]:
+    return {stage: histogram.snapshot() for stage, histogram in list(_stages.items())}
+
+
+def _write_snapshot():
+    path = Path(METRICS_DIR) / f"stages_{os.getpid()}.json"
+    tmp = path.with_suffix(".tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_text(json.dumps(_snapshot()))
+        os.replace(tmp, path)  # readers never see a half-written file
+    except OSError as e:
+        logger.warning(f"Couldn't write metrics snapshot {path}: {e}")
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        _write_snapshot()
+
+
+def _start_flusher():
+    global _flusher
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True)
+            _flusher.start()
+            atexit.register(_write_snapshot)
+
+
+def _after_fork():
+    # A forked worker starts from zero; what the master timed (preloading) stays the master's
+    global _flusher, _stages_lock, _flusher_lock
+    _stages.clear()
+    _stages_lock = threading.Lock()
+    _flusher_lock = threading.Lock()
+    _flusher = None
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def _merged_snapshots() -> Dict[str, Dict]:
+    """All workers' histograms summed, this process's counted as of now"""
+    _write_snapshot()
+    merged: Dict[str, Dict] = {}
+    for path in Path(METRICS_DIR).glob("stages_*.json"):
+        try:
+            snapshot = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        for stage, h in snapshot.items():
+            into = merged.setdefault(stage, {"counts": [0] * len(h["counts"]), "total": 0.0, "count": 0, "errors": 0})
+            into["counts"] = [a + b for a, b in zip(into["counts"], h["counts"])]
+            into["total"] += h["total"]
+            into["count"] += h["count"]
+            into["errors"] += h["errors"]
+    return merged
+
+
+# ─────────────────────────────────────────────────────────────
+# Export
+# ─────────────────────────────────────────────────────────────
+
+def render_prometheus() -> str:
+    name = f"{METRIC_PREFIX}_stage_duration_seconds"
+    lines = [
+        f"# HELP {name} Time spent in each query pipeline stage",
+        f"# TYPE {name} histogram",
+    ]
+    snapshots = _merged_snapshots() if METRICS_DIR else _snapshot()
+    errors: List[str] = []
+    for stage in sorted(snapshots):
+        h = snapshots[stage]
+        cumulative = 0
+        for bound, n in zip(STAGE_BUCKETS, h["counts"]):
+            cumulative += n
+            lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {h["count"]}')
+        lines.append(f'{name}_sum{{stage="{stage}"}} {h["total"]:.6f}')
+        lines.append(f'{name}_count{{stage="{stage}"}} {h["count"]}')
+        errors.append(f'{METRIC_PREFIX}_stage_errors_total{{stage="{stage}"}} {h["errors"]}')
+    lines += [
+        f"# HELP {METRIC_PREFIX}_stage_errors_total Stage runs that raised",
+        f"# TYPE {METRIC_PREFIX}_stage_errors_total counter",
+        *errors,
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def server_timing(timings: Dict[str, float], total_ms: float) -> str:
+    parts = [f"{stage};dur={ms:.1f}" for stage, ms in timings.items()]
+    parts.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(parts)
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware adding `Server-Timing: <stage>;dur=<ms>, …, total;dur=<ms>` to each
+    HTTP response. Streaming responses send their headers first, so they only carry
+    the stages that finished before the first byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                header = server_timing(timings, (time.perf_counter() - started) * 1000)
+                message["headers"] = [*message.get("headers", []), (b"server-timing", header.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
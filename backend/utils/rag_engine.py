@@ -5,12 +5,27 @@ Retrieval-Augmented Generation pipeline using FAISS + LLM
 
 import os
 import json
+import sqlite3
+import asyncio
+import threading
 import faiss
 import numpy as np
 import logging
+from collections import ChainMap
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
-from sentence_transformers import SentenceTransformer
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+
+from utils.embeddings import get_model, encode
+from utils.index_store import load_index, content_version, load_segment, save_segment, segment_seq
+from utils.batch_embedder import BatchingEmbedder
+from utils.lexical_index import BM25Index
+from utils.ann import index_spec_from_env, SQ_TYPES
+from utils.doc_store import ColumnStore
+from utils.chunking import split_passages, pack_context, CONTEXT_TOKEN_BUDGET
+from utils.database import (
+    acquire_lease, kb_changes_since, kb_get_documents, kb_get_passages, kb_live_vectors, kb_max_seq,
+)
+from utils.metrics import span
 
 logger = logging.getLogger(__name__)
 
@@ -179,82 +194,506 @@ AGRICULTURAL_KNOWLEDGE = [
 ]
 
 
+RAG_INDEX_NAME = "rag"
+
+# "hybrid" fuses BM25 and dense rankings (RRF); "dense" is FAISS only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Candidates taken from each ranking before fusion, as a multiple of top_k
+HYBRID_CANDIDATES = 4
+# Passages searched per wanted document (several passages of one doc may match)
+PASSAGES_PER_DOC = 3
+DENSE_THRESHOLD = 0.1
+# Queries per encode + search in bulk retrieval (bounds memory for thousands of queries)
+BULK_RETRIEVE_CHUNK = int(os.getenv("BULK_RETRIEVE_CHUNK", "256"))
+
+# Ingested passages (utils/ingest.py) are keyed by their kb_passages.vector_id; passage
+# keys at or above this offset refer to them, and document keys at or above it to
+# kb_documents.id. They are searched in two parts: a persisted segment built with the
+# configured index spec (index_store artifact INGESTED_INDEX_NAME, memory-mapped and
+# shared by workers) and a small brute-force live segment holding changes made since.
+LIVE_ID_OFFSET = 1 << 40
+KB_SYNC_INTERVAL = float(os.getenv("KB_SYNC_INTERVAL", "10"))
+INGESTED_INDEX_NAME = "rag_ingested"
+# Live-segment size (added passages + deletions of folded ones) at which one worker
+# folds everything into a rebuilt persisted segment; bounds the brute-force scan.
+KB_FOLD_THRESHOLD = int(os.getenv("KB_FOLD_THRESHOLD", "2000"))
+KB_FOLD_LEASE_TTL = 3600
+
+# Columns of the in-memory document / passage stores (utils.doc_store)
+DOC_FIELDS = ("id", "category", "subcategory", "title", "content")
+PASSAGE_FIELDS = ("id", "title", "text")
+
+
+def doc_text(doc: Dict) -> str:
+    return f"{doc['title']}. {doc['content']}"
+
+
+def passage_text(passage: Dict) -> str:
+    """Embedded text of a passage — the parent title keeps short passages on topic"""
+    return f"{passage['title']}. {passage['text']}"
+
+
+def split_documents(docs: List[Dict]) -> List[Dict]:
+    """Overlapping passages of every doc; `doc` is the parent's position in `docs`"""
+    passages = []
+    for i, doc in enumerate(docs):
+        for n, text in enumerate(split_passages(doc['content'])):
+            passages.append({"id": f"{doc['id']}#{n}", "doc": i, "passage_no": n, "title": doc['title'], "text": text})
+    return passages
+
+
 class RAGEngine:
     """Core Retrieval-Augmented Generation Engine"""
 
-    def __init__(self):
+    def __init__(self, index_spec: Optional[Dict] = None, sync: bool = True):
+        # FAISS index type and knobs (flat / ivf_flat / hnsw / ivf_pq), see utils.ann
+        self.index_spec = index_spec or index_spec_from_env()
         self.model = None
         self.index = None
+        self.lexical: Optional[BM25Index] = None
         self.documents = []
+        self.passages = []
+        self.doc_passages: List[List[int]] = []
+        self.base_version: Optional[str] = None
+        self.kb_version: Optional[str] = None
+        self.segment: Optional[faiss.Index] = None
+        self.segment_ids = np.empty(0, dtype=np.int64)
+        self.segment_seq = 0
+        # vector_ids in the persisted segment deleted since it was built (replaced, never mutated)
+        self.tombstones: frozenset = frozenset()
+        self.live_index: Optional[faiss.IndexIDMap2] = None
+        self.live_seq = 0
+        self._live_lock = threading.Lock()
         self.initialized = False
-        self._load()
+        self.batcher = BatchingEmbedder(self._retrieve_batch_with_embeddings, name="rag_retrieve")
+        self._load(sync)
 
-    def _load(self):
+    def _load(self, sync: bool = True):
         """Initialize embedding model and FAISS index"""
         try:
-            logger.info("Loading Sentence Transformer model...")
-            self.model = SentenceTransformer('all-MiniLM-L6-v2')
+            self.model = get_model()
             logger.info("✅ Model loaded")
 
-            self.documents = AGRICULTURAL_KNOWLEDGE
-            texts = [f"{d['title']}. {d['content']}" for d in self.documents]
-
-            logger.info("Building FAISS index...")
-            embeddings = self.model.encode(texts, show_progress_bar=False)
-            embeddings = np.array(embeddings).astype('float32')
-
-            dimension = embeddings.shape[1]
-            self.index = faiss.IndexFlatIP(dimension)  # Inner product (cosine after normalization)
-            faiss.normalize_L2(embeddings)
-            self.index.add(embeddings)
+            passages = split_documents(AGRICULTURAL_KNOWLEDGE)
+            self.doc_passages = [[] for _ in AGRICULTURAL_KNOWLEDGE]
+            for i, passage in enumerate(passages):
+                self.doc_passages[passage['doc']].append(i)
+            self.index, _ = load_index(RAG_INDEX_NAME, passages, passage_text, self.index_spec)
+            self.base_version = content_version(passages, passage_text)
+            self.kb_version = self.base_version
+            # Results are views into these stores, not per-hit dict copies
+            self.documents = ColumnStore(AGRICULTURAL_KNOWLEDGE, DOC_FIELDS, list_fields=("tags",))
+            self.passages = ColumnStore(passages, PASSAGE_FIELDS, int_fields=("doc", "passage_no"))
+            self.lexical = BM25Index(self.documents, doc_text, lambda d: d.get('tags', []))
+            # Memory-mapped file only, so this is safe in a parent process that forks workers
+            segment, ids, seq = self._open_segment()
+            self._use_segment(segment, ids, seq, replay=False)
 
             self.initialized = True
-            logger.info(f"✅ FAISS index built with {len(self.documents)} documents")
+            logger.info(f"✅ FAISS index ready with {len(self.passages)} passages from {len(self.documents)} documents")
+
+            if sync:
+                self.sync_live()
 
         except Exception as e:
             logger.error(f"RAG Engine initialization failed: {e}")
             self.initialized = False
 
-    def retrieve(self, query: str, top_k: int = 4) -> List[Dict]:
-        """Retrieve top-k relevant documents for a query"""
+    def _live_store(self, dimension: int) -> faiss.Index:
+        """Ingested passages are added one batch at a time, so only train-free float16 compacts them"""
+        if self.index_spec.get("storage", "float32") != "float32":
+            return faiss.IndexScalarQuantizer(dimension, SQ_TYPES["float16"], faiss.METRIC_INNER_PRODUCT)
+        return faiss.IndexFlatIP(dimension)
+
+    def _open_segment(self) -> Tuple[Optional[faiss.Index], np.ndarray, int]:
+        stored = load_segment(INGESTED_INDEX_NAME, self.index_spec)
+        if stored is None:
+            return None, np.empty(0, dtype=np.int64), 0
+        return stored
+
+    @staticmethod
+    def _apply_changes(live_index: faiss.IndexIDMap2, segment_ids: np.ndarray, chunk) -> np.ndarray:
+        """Apply one kb_changes_since chunk to a live segment; returns deleted ids of the persisted one"""
+        removed = np.array([vid for vid, _, _, _ in chunk], dtype=np.int64)
+        added = [(vid, emb) for vid, _, deleted, emb in chunk if not deleted and emb]
+        live_index.remove_ids(removed)
+        if added:
+            vectors = np.stack([np.frombuffer(emb, dtype=np.float32) for _, emb in added])
+            live_index.add_with_ids(vectors, np.array([vid for vid, _ in added], dtype=np.int64))
+        # vector_ids are never reused, so a changed row that is in the segment was deleted
+        return removed[np.isin(removed, segment_ids)]
+
+    def _use_segment(self, segment: Optional[faiss.Index], ids: np.ndarray, seq: int, replay: bool = True) -> int:
+        """
+        Serve a (new) persisted segment with a live segment restarted from its seq. With
+        replay, later changes go into the new live segment before the swap, so searches
+        keep using the old pair until the new one is complete.
+        """
+        live_index = faiss.IndexIDMap2(self._live_store(self.index.d))
+        tombstones = set()
+        live_seq, applied = seq, 0
+        if replay:
+            for chunk in kb_changes_since(seq):
+                tombstones.update(self._apply_changes(live_index, ids, chunk).tolist())
+                live_seq = chunk[-1][1]
+                applied += len(chunk)
+        with self._live_lock:
+            self.segment, self.segment_ids, self.segment_seq = segment, ids, seq
+            self.tombstones = frozenset(tombstones)
+            self.live_index = live_index
+            self.live_seq = live_seq
+            self.kb_version = f"{self.base_version}:{live_seq}" if live_seq else self.base_version
+        return applied
+
+    @property
+    def live_backlog(self) -> int:
+        """Entries the next fold would absorb: live passages plus deletions of folded ones"""
+        return self.live_index.ntotal + len(self.tombstones)
+
+    def sync_live(self) -> int:
+        """Pick up a newly folded segment, then replay later kb_passages changes into the live segment"""
+        applied = 0
+        try:
+            if segment_seq(INGESTED_INDEX_NAME, self.index_spec) > self.segment_seq:
+                stored = load_segment(INGESTED_INDEX_NAME, self.index_spec)
+                if stored is not None and stored[2] > self.segment_seq:
+                    applied += self._use_segment(*stored)
+                    logger.info(f"✅ Loaded ingested segment: {stored[0].ntotal} passages up to seq {stored[2]}")
+            for chunk in kb_changes_since(self.live_seq):
+                with self._live_lock:
+                    folded = self._apply_changes(self.live_index, self.segment_ids, chunk)
+                    if len(folded):
+                        self.tombstones = self.tombstones | frozenset(folded.tolist())
+                    self.live_seq = chunk[-1][1]
+                    self.kb_version = f"{self.base_version}:{self.live_seq}"
+                applied += len(chunk)
+        except sqlite3.OperationalError as e:
+            logger.debug(f"No ingested documents to sync: {e}")
+        if applied:
+            logger.info(f"✅ Live KB synced: {applied} changes, {self.live_backlog} unfolded")
+        return applied
+
+    def _dense_candidates(self, query_embeddings: np.ndarray, k: int) -> List[List[Tuple[float, int]]]:
+        """Best (score, passage key) pairs per query across the base index and both ingested segments"""
+        with span("faiss_search"):
+            scores, indices = self.index.search(query_embeddings, k)
+        rows = [
+            [(float(s), int(i)) for s, i in zip(scores[r], indices[r]) if i >= 0 and s > DENSE_THRESHOLD]
+            for r in range(len(query_embeddings))
+        ]
+        extra = []
+        with self._live_lock:
+            segment, segment_ids, tombstones = self.segment, self.segment_ids, self.tombstones
+            if self.live_index is not None and self.live_index.ntotal:
+                with span("faiss_search_live"):
+                    live_scores, live_ids = self.live_index.search(query_embeddings, min(k, self.live_index.ntotal))
+                extra.append((live_scores, live_ids))
+        if segment is not None and segment.ntotal:
+            # The segment is read-only (a fold replaces it), so it is searched outside the lock;
+            # over-fetch by the tombstones that may fill the top k
+            with span("faiss_search_ingested"):
+                seg_scores, seg_rows = segment.search(query_embeddings, min(k + len(tombstones), segment.ntotal))
+            seg_ids = np.where(seg_rows >= 0, segment_ids[np.maximum(seg_rows, 0)], -1)
+            extra.append((seg_scores, seg_ids))
+        if not extra:
+            return rows
+        for r, row in enumerate(rows):
+            for scores, ids in extra:
+                row.extend(
+                    (float(s), LIVE_ID_OFFSET + int(i))
+                    for s, i in zip(scores[r], ids[r])
+                    if i >= 0 and s > DENSE_THRESHOLD and int(i) not in tombstones
+                )
+            row.sort(reverse=True)
+            del row[k:]
+        return rows
+
+    def _resolve_passages(self, keys) -> Dict[int, Tuple[int, Dict]]:
+        """(parent doc key, passage) per passage key; ingested passages are read from SQLite"""
+        resolved = {}
+        for k in keys:
+            if k < LIVE_ID_OFFSET:
+                p = self.passages[k]
+                resolved[k] = (p['doc'], {"text": p['text'], "passage_no": p['passage_no']})
+        live = [k - LIVE_ID_OFFSET for k in keys if k >= LIVE_ID_OFFSET]
+        if live:
+            with span("sqlite_kb_read"):
+                live_passages = kb_get_passages(live)
+            for vid, p in live_passages.items():
+                resolved[LIVE_ID_OFFSET + vid] = (LIVE_ID_OFFSET + p['document'], {"text": p['text'], "passage_no": p['passage_no']})
+        return resolved
+
+    def _resolve(self, keys) -> Dict[int, Dict]:
+        """Doc mappings for document keys (shared, never mutate); ingested docs are read from SQLite"""
+        docs = {k: self.documents[k] for k in keys if k < LIVE_ID_OFFSET}
+        live = [k - LIVE_ID_OFFSET for k in keys if k >= LIVE_ID_OFFSET]
+        if live:
+            with span("sqlite_kb_read"):
+                live_docs = kb_get_documents(live)
+            for doc_id, doc in live_docs.items():
+                docs[LIVE_ID_OFFSET + doc_id] = doc
+        return docs
+
+    def _passage_hits(self, query_embeddings: np.ndarray, k: int) -> List[Dict[int, List[Dict]]]:
+        """
+        Per query: doc key → its matching passages (with `score`, best first), for up to
+        k docs ordered by their best passage.
+        """
+        candidates = self._dense_candidates(query_embeddings, k * PASSAGES_PER_DOC)
+        passages = self._resolve_passages({key for row in candidates for _, key in row})
+
+        batch_hits = []
+        for row in candidates:
+            hits: Dict[int, List[Dict]] = {}
+            for score, key in row:
+                if key not in passages:
+                    continue
+                doc_key, passage = passages[key]
+                if doc_key in hits or len(hits) < k:
+                    hits.setdefault(doc_key, []).append(dict(passage, score=score))
+            batch_hits.append(hits)
+        return batch_hits
+
+    def search_embeddings(self, query_embeddings: np.ndarray, top_ks: List[int]) -> List[List[Dict]]:
+        """
+        Top-k documents for already-encoded queries with one index search. A doc scores as
+        its best passage; `passages` holds the passages that matched. Each result is a
+        ChainMap of the per-hit fields over the shared stored document, not a copy.
+        """
+        batch_hits = self._passage_hits(query_embeddings, max(top_ks))
+        ranked = [list(hits.items())[:top_k] for hits, top_k in zip(batch_hits, top_ks)]
+        docs = self._resolve({key for row in ranked for key, _ in row})
+
+        batch_results = []
+        for row in ranked:
+            results = []
+            for key, passages in row:
+                if key in docs:
+                    results.append(ChainMap({
+                        'relevance_score': passages[0]['score'],
+                        'passages': passages,
+                    }, docs[key]))
+            batch_results.append(results)
+
+        return batch_results
+
+    def hybrid_search(self, queries: List[str], query_embeddings: np.ndarray, top_ks: List[int]) -> List[List[Dict]]:
+        """
+        Fuse BM25 and dense rankings with reciprocal-rank fusion.
+        relevance_score is the RRF score; dense_score / lexical_score are the components.
+        Documents rank densely by their best passage; BM25 runs over whole built-in
+        documents, so ingested documents take part through the dense ranking only.
+        """
+        n_candidates = max(top_ks) * HYBRID_CANDIDATES
+        batch_hits = self._passage_hits(query_embeddings, n_candidates)
+
+        ranked = []
+        for query, top_k, hits in zip(queries, top_ks, batch_hits):
+            fused: Dict[int, float] = {}
+            for rank, key in enumerate(hits, 1):
+                fused[key] = 1.0 / (RRF_K + rank)
+
+            with span("bm25"):
+                lexical = self.lexical.search(query, n_candidates)
+            for rank, (score, idx) in enumerate(lexical, 1):
+                fused[idx] = fused.get(idx, 0.0) + 1.0 / (RRF_K + rank)
+            lexical_scores = {idx: score for score, idx in lexical}
+
+            top = sorted(fused, key=fused.get, reverse=True)[:top_k]
+            ranked.append([(key, fused[key], hits.get(key), lexical_scores.get(key, 0.0)) for key in top])
+
+        docs = self._resolve({key for row in ranked for key, *_ in row})
+        batch_results = []
+        for row in ranked:
+            results = []
+            for key, fused_score, passages, lexical_score in row:
+                if key in docs:
+                    if passages is None:
+                        # Lexical-only match: offer all its passages, unscored, in document order
+                        passages = [
+                            {"text": self.passages[i]['text'], "passage_no": self.passages[i]['passage_no'], "score": 0.0}
+                            for i in self.doc_passages[key]
+                        ]
+                    results.append(ChainMap({
+                        'relevance_score': fused_score,
+                        'dense_score': passages[0]['score'] if passages else 0.0,
+                        'lexical_score': lexical_score,
+                        'passages': passages,
+                    }, docs[key]))
+            batch_results.append(results)
+
+        return batch_results
+
+    def _search(self, queries: List[str], query_embeddings: np.ndarray, top_ks: List[int]) -> List[List[Dict]]:
+        if RETRIEVAL_MODE == "hybrid" and self.lexical is not None:
+            return self.hybrid_search(queries, query_embeddings, top_ks)
+        return self.search_embeddings(query_embeddings, top_ks)
+
+    def retrieve_batch(self, queries: List[str], top_ks: List[int]) -> List[List[Dict]]:
+        """Retrieve top-k documents for many queries with one encode and one search"""
+        if not self.initialized or not queries:
+            return [[] for _ in queries]
+        with span("embed"):
+            query_embeddings = encode(queries)
+        return self._search(queries, query_embeddings, top_ks)
+
+    def _retrieve_batch_with_embeddings(self, queries: List[str], top_ks: List[int]) -> List[Tuple[Optional[np.ndarray], List[Dict]]]:
+        if not self.initialized or not queries:
+            return [(None, []) for _ in queries]
+        with span("embed"):
+            query_embeddings = encode(queries)
+        return list(zip(query_embeddings, self._search(queries, query_embeddings, top_ks)))
+
+    def hybrid_retrieve(self, query: str, top_k: int = 4) -> List[Dict]:
+        """Hybrid BM25 + dense retrieval regardless of RETRIEVAL_MODE"""
         if not self.initialized:
             return []
+        with span("embed"):
+            query_embedding = encode([query])
+        return self.hybrid_search([query], query_embedding, [top_k])[0]
 
-        query_embedding = self.model.encode([query], show_progress_bar=False)
-        query_embedding = np.array(query_embedding).astype('float32')
-        faiss.normalize_L2(query_embedding)
-
-        scores, indices = self.index.search(query_embedding, top_k)
+    def retrieve(self, query: str, top_k: int = 4) -> List[Dict]:
+        """Retrieve top-k relevant documents for a query"""
+        return self.retrieve_batch([query], [top_k])[0]
 
+    def retrieve_many(self, queries: List[str], top_k: int = 4,
+                      chunk_size: int = BULK_RETRIEVE_CHUNK) -> List[List[Dict]]:
+        """Bulk retrieval for offline jobs: one encode and one search per chunk of queries"""
         results = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx >= 0 and score > 0.1:
-                doc = self.documents[idx].copy()
-                doc['relevance_score'] = float(score)
-                results.append(doc)
-
+        for start in range(0, len(queries), chunk_size):
+            chunk = queries[start:start + chunk_size]
+            results.extend(self.retrieve_batch(chunk, [top_k] * len(chunk)))
         return results
 
+    async def aretrieve_many(self, queries: List[str], top_k: int = 4, chunk_size: int = BULK_RETRIEVE_CHUNK,
+                             return_exceptions: bool = False) -> AsyncIterator[Tuple[int, List[List[Dict]]]]:
+        """
+        retrieve_many() on the CPU executor, yielding (offset, results) as each chunk
+        finishes. With return_exceptions a failed chunk yields (offset, exception) and
+        the remaining chunks still run, like asyncio.gather.
+        """
+        from utils.concurrency import run_cpu
+        for start in range(0, len(queries), chunk_size):
+            chunk = queries[start:start + chunk_size]
+            try:
+                results = await run_cpu(self.retrieve_batch, chunk, [top_k] * len(chunk))
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                logger.warning(f"Bulk retrieval of queries {start}-{start + len(chunk) - 1} failed: {e}")
+                results = e
+            yield start, results
+
+    async def aretrieve_with_embedding(self, query: str, top_k: int = 4) -> Tuple[Optional[np.ndarray], List[Dict]]:
+        """Retrieve via the batching embedder so concurrent queries share one forward pass"""
+        return await self.batcher.submit(query, top_k)
+
+    async def aretrieve(self, query: str, top_k: int = 4) -> List[Dict]:
+        _, docs = await self.aretrieve_with_embedding(query, top_k)
+        return docs
+
+    @staticmethod
+    def build_context(docs: List[Dict], budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+        """Pack the best passages of the retrieved documents into the LLM context block"""
+        return pack_context(docs, budget)
+
     def get_context(self, query: str, top_k: int = 4) -> Tuple[str, List[Dict]]:
         """Get formatted context string and source documents"""
         docs = self.retrieve(query, top_k)
         if not docs:
             return "", []
+        return self.build_context(docs), docs
 
-        context_parts = []
-        for i, doc in enumerate(docs, 1):
-            context_parts.append(
-                f"[Source {i}: {doc['title']}]\n{doc['content']}"
-            )
-
-        return "\n\n".join(context_parts), docs
+    async def aget_context(self, query: str, top_k: int = 4) -> Tuple[str, List[Dict]]:
+        docs = await self.aretrieve(query, top_k)
+        if not docs:
+            return "", []
+        return self.build_context(docs), docs
 
 
 # Singleton instance
 _rag_engine: Optional[RAGEngine] = None
+_rag_engine_lock = threading.Lock()
 
 def get_rag_engine() -> RAGEngine:
+    """Build the singleton on first use (blocking); concurrent callers wait for the same build"""
     global _rag_engine
     if _rag_engine is None:
-        _rag_engine = RAGEngine()
+        with _rag_engine_lock:
+            if _rag_engine is None:
+                _rag_engine = RAGEngine()
+    return _rag_engine
+
+
+async def aget_rag_engine() -> RAGEngine:
+    """get_rag_engine() for request handlers: while warm-up is still loading, wait off the event loop"""
+    if _rag_engine is not None:
+        return _rag_engine
+    return await asyncio.to_thread(get_rag_engine)
+
+
+def preload_rag_engine() -> RAGEngine:
+    """
+    Build the singleton without touching SQLite, for a parent process that forks workers
+    (a connection must not cross fork); each worker's kb_sync_loop then replays ingests
+    """
+    global _rag_engine
+    with _rag_engine_lock:
+        if _rag_engine is None:
+            _rag_engine = RAGEngine(sync=False)
+    return _rag_engine
+
+
+def get_loaded_rag_engine() -> Optional[RAGEngine]:
+    """The singleton if it has already been built (doesn't trigger loading)"""
     return _rag_engine
+
+
+def fold_ingested(index_spec: Optional[Dict] = None) -> bool:
+    """
+    Rebuild the persisted segment of ingested passages from kb_passages with the
+    configured index spec. Workers switch to it on their next sync_live. False if the
+    stored segment is already current.
+    """
+    spec = index_spec or index_spec_from_env()
+    max_seq = kb_max_seq()
+    if max_seq <= segment_seq(INGESTED_INDEX_NAME, spec):
+        return False
+    count, chunks = kb_live_vectors(max_seq)
+    ids = np.empty(count, dtype=np.int64)
+    vectors = None
+    n = 0
+    for chunk in chunks:
+        # Rows deleted after the count was taken drop out, so the chunks never exceed it
+        block = np.frombuffer(b"".join(emb for _, emb in chunk), dtype=np.float32).reshape(len(chunk), -1)
+        if vectors is None:
+            vectors = np.empty((count, block.shape[1]), dtype=np.float32)
+        ids[n:n + len(chunk)] = [vid for vid, _ in chunk]
+        vectors[n:n + len(chunk)] = block
+        n += len(chunk)
+    if vectors is None:
+        # Every ingested passage was deleted: an empty segment still clears the tombstones
+        vectors = np.empty((0, encode(["dimension probe"]).shape[1]), dtype=np.float32)
+    save_segment(INGESTED_INDEX_NAME, ids[:n], vectors[:n], spec, max_seq)
+    return True
+
+
+async def kb_sync_loop(interval: float = KB_SYNC_INTERVAL):
+    """
+    Periodically pull documents ingested by other workers / the CLI into this worker.
+    Once the live segment reaches KB_FOLD_THRESHOLD, the worker holding the "kb_fold"
+    lease folds it into the persisted segment.
+    """
+    from utils.concurrency import run_ingest
+    while True:
+        engine = get_loaded_rag_engine()
+        if engine is not None and engine.initialized:
+            try:
+                await run_ingest(engine.sync_live)
+                if engine.live_backlog >= KB_FOLD_THRESHOLD and await run_ingest(acquire_lease, "kb_fold", KB_FOLD_LEASE_TTL):
+                    if await run_ingest(fold_ingested, engine.index_spec):
+                        await run_ingest(engine.sync_live)
+            except Exception as e:
+                logger.warning(f"KB sync failed: {e}")
+        await asyncio.sleep(interval)
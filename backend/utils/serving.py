@@ -0,0 +1,44 @@
+"""
+KrishiSahay Serving
+Process-level setup for multi-worker serving: read-only state is loaded once in the
+gunicorn master and shared copy-on-write by the forked workers (see gunicorn.conf.py)
+"""
+
+import os
+import gc
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Intra-op threads per worker for the embedding runtime / faiss; 0 splits the cores evenly across workers
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "0"))
+
+
+def worker_threads(workers: int) -> int:
+    if WORKER_THREADS > 0:
+        return WORKER_THREADS
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def freeze_shared():
+    """
+    Move everything loaded so far into the GC's permanent generation before forking.
+    Collections in the workers then never write to those objects' headers, so the
+    pages holding them stay shared instead of being copied into every worker.
+    """
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Froze {gc.get_freeze_count()} preloaded objects before fork")
+
+
+def configure_worker(workers: int):
+    """Call in each worker right after fork: size the thread pools so N workers don't oversubscribe the cores"""
+    from utils.embeddings import set_num_threads
+    threads = worker_threads(workers)
+    set_num_threads(threads)
+    try:
+        import faiss
+        faiss.omp_set_num_threads(threads)
+    except ImportError:
+        pass
+    logger.info(f"Worker {os.getpid()}: {threads} intra-op threads")
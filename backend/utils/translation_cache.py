@@ -0,0 +1,97 @@
+"""
+KrishiSahay Translation Cache
+In-memory LRU in front of a persistent SQLite table, keyed by
+(source language, target language, text hash)
+"""
+
+import os
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from utils.database import translations_get, translations_put
+
+logger = logging.getLogger(__name__)
+
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", "5000"))
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class TranslationCache:
+    """Memory hits cost a dict lookup; memory misses fall through to SQLite, which survives restarts"""
+
+    def __init__(self, max_entries: int = TRANSLATION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: Tuple[str, str, str], translated: str):
+        self._entries[key] = translated
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def lookup(self, source: str, target: str, texts: List[str]) -> Dict[str, str]:
+        """Memory-only lookup; cheap enough to call on the event loop"""
+        found = {}
+        with self._lock:
+            for text in texts:
+                key = (source, target, text_hash(text))
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[text] = self._entries[key]
+            self.memory_hits += len(found)
+        return found
+
+    def load(self, source: str, target: str, texts: List[str]) -> Dict[str, str]:
+        """SQLite lookup for memory misses (blocking); hits are promoted into memory"""
+        hashes = {text_hash(t): t for t in texts}
+        try:
+            rows = translations_get(source, target, list(hashes))
+        except sqlite3.OperationalError as e:
+            logger.debug(f"Translation store unavailable: {e}")
+            rows = {}
+        found = {hashes[h]: translated for h, translated in rows.items()}
+        with self._lock:
+            for h, translated in rows.items():
+                self._remember((source, target, h), translated)
+            self.store_hits += len(found)
+            self.misses += len(texts) - len(found)
+        return found
+
+    def put_many(self, source: str, target: str, translations: Dict[str, str]):
+        """Remember fresh translations in memory and persist them (blocking)"""
+        rows = [(text_hash(text), translated) for text, translated in translations.items()]
+        with self._lock:
+            for h, translated in rows:
+                self._remember((source, target, h), translated)
+        try:
+            translations_put(source, target, rows)
+        except sqlite3.OperationalError as e:
+            logger.debug(f"Translation store unavailable: {e}")
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "memory_hits": self.memory_hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+        }
+
+
+_translation_cache: Optional[TranslationCache] = None
+
+def get_translation_cache() -> TranslationCache:
+    global _translation_cache
+    if _translation_cache is None:
+        _translation_cache = TranslationCache()
+    return _translation_cache
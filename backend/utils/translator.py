@@ -3,20 +3,27 @@ KrishiSahay Translation Utility
 Multi-language support for Indian languages
 """
 
+import os
+import re
+import asyncio
 import logging
-from typing import Optional
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from utils.chunking import split_sentences
+from utils.translation_cache import get_translation_cache
+from utils.metrics import span
 
 logger = logging.getLogger(__name__)
 
-# Language detection patterns (simple keyword-based for demo)
-LANG_PATTERNS = {
-    "hi": ["क्या", "कैसे", "मेरी", "फसल", "किसान", "बीमारी", "खाद", "सिंचाई", "है", "का"],
-    "te": ["ఏమి", "ఎలా", "పంట", "రైతు", "వ్యాధి", "ఎరువు", "నీటి", "ఉంది"],
-    "ta": ["என்ன", "எப்படி", "பயிர்", "விவசாயி", "நோய்", "உரம்", "நீர்ப்பாசனம்"],
-    "mr": ["काय", "कसे", "पीक", "शेतकरी", "रोग", "खत", "सिंचन"],
-    "bn": ["কী", "কীভাবে", "ফসল", "কৃষক", "রোগ", "সার", "সেচ"],
-    "kn": ["ಏನು", "ಹೇಗೆ", "ಬೆಳೆ", "ರೈತ", "ರೋಗ", "ಗೊಬ್ಬರ"],
-}
+# "google" (deep-translator, online) or "nllb" (local transformers model, offline)
+TRANSLATION_BACKEND = os.getenv("TRANSLATION_BACKEND", "google")
+TRANSLATION_MODEL = os.getenv("TRANSLATION_MODEL", "facebook/nllb-200-distilled-600M")
+TRANSLATION_WORKERS = int(os.getenv("TRANSLATION_WORKERS", "4"))
+# Characters per backend request (Google's limit is 5000)
+TRANSLATION_BATCH_CHARS = 4500
 
 # Common agricultural term translations (EN → target)
 TRANSLATIONS = {
@@ -43,59 +50,201 @@ TRANSLATIONS = {
     },
 }
 
-async def detect_language(text: str) -> str:
-    """Detect language from text"""
-    try:
-        # Try langdetect if available
-        from langdetect import detect
-        lang = detect(text)
-        return lang
-    except Exception:
-        pass
+# ─────────────────────────────────────────────────────────────
+# Translation backends
+# ─────────────────────────────────────────────────────────────
 
-    # Fallback: check for known script patterns
-    for lang, patterns in LANG_PATTERNS.items():
-        for pattern in patterns:
-            if pattern in text:
-                return lang
+class TranslationBackend(ABC):
+    """Translates a batch of segments in one call; None for segments it couldn't translate"""
+    name = "none"
 
-    return "en"
+    @abstractmethod
+    def translate_batch(self, segments: List[str], source: str, target: str) -> List[Optional[str]]:
+        ...
 
 
-async def translate_to_english(text: str, source_lang: str) -> str:
-    """Translate text to English"""
-    if source_lang == "en":
-        return text
+class GoogleBackend(TranslationBackend):
+    name = "google"
 
-    try:
+    def __init__(self):
+        # GoogleTranslator keeps per-request state on the instance, so each pool thread gets its own
+        self._local = threading.local()
+
+    def _translator(self, source: str, target: str):
         from deep_translator import GoogleTranslator
-        translated = GoogleTranslator(source=source_lang, target='en').translate(text)
-        if translated:
-            return translated
+        translators = self._local.__dict__.setdefault("translators", {})
+        if (source, target) not in translators:
+            translators[(source, target)] = GoogleTranslator(source=source, target=target)
+        return translators[(source, target)]
+
+    def translate_batch(self, segments: List[str], source: str, target: str) -> List[Optional[str]]:
+        translator = self._translator(source, target)
+        # One request for the whole batch; line breaks survive translation and split it back up
+        joined = translator.translate("\n".join(segments))
+        parts = joined.split("\n") if joined else []
+        if len(parts) == len(segments):
+            return [p.strip() or None for p in parts]
+        return [translator.translate(segment) for segment in segments]
+
+
+# FLORES-200 codes used by NLLB models
+NLLB_CODES = {
+    "en": "eng_Latn", "hi": "hin_Deva", "te": "tel_Telu", "ta": "tam_Taml",
+    "mr": "mar_Deva", "bn": "ben_Beng", "gu": "guj_Gujr", "kn": "kan_Knda",
+    "ml": "mal_Mlym", "pa": "pan_Guru",
+}
+
+
+class NLLBBackend(TranslationBackend):
+    """Offline translation with a local NLLB model (loaded on first use)"""
+    name = "nllb"
+
+    def __init__(self, model_name: str = TRANSLATION_MODEL):
+        self.model_name = model_name
+        self._pipeline = None
+        self._lock = threading.Lock()
+
+    def translate_batch(self, segments: List[str], source: str, target: str) -> List[Optional[str]]:
+        with self._lock:
+            if self._pipeline is None:
+                from transformers import pipeline
+                logger.info(f"Loading translation model {self.model_name}...")
+                self._pipeline = pipeline("translation", model=self.model_name)
+            outputs = self._pipeline(
+                segments, src_lang=NLLB_CODES[source], tgt_lang=NLLB_CODES[target],
+                batch_size=len(segments), max_length=512,
+            )
+        return [o["translation_text"] for o in outputs]
+
+
+BACKENDS = {"google": GoogleBackend, "nllb": NLLBBackend}
+
+_backend: Optional[TranslationBackend] = None
+_executor = ThreadPoolExecutor(max_workers=TRANSLATION_WORKERS, thread_name_prefix="translate")
+
+
+def get_backend() -> TranslationBackend:
+    global _backend
+    if _backend is None:
+        if TRANSLATION_BACKEND not in BACKENDS:
+            logger.warning(f"Unknown TRANSLATION_BACKEND '{TRANSLATION_BACKEND}', using google")
+        _backend = BACKENDS.get(TRANSLATION_BACKEND, GoogleBackend)()
+    return _backend
+
+
+def shutdown_translation_executor():
+    _executor.shutdown(wait=False, cancel_futures=True)
+
+
+def translation_stats() -> Dict:
+    return {"backend": get_backend().name, "cache": get_translation_cache().stats()}
+
+
+# ─────────────────────────────────────────────────────────────
+# Batched, cached translation
+# ─────────────────────────────────────────────────────────────
+
+_LINE_BREAKS = re.compile(r"(\n+)")
+
+
+def _split(text: str) -> List[Tuple[bool, str]]:
+    """(translatable, piece) pairs — sentences plus the line breaks / spaces between them"""
+    pieces = []
+    for part in _LINE_BREAKS.split(text):
+        if not part.strip():
+            pieces.append((False, part))
+            continue
+        for i, sentence in enumerate(split_sentences(part)):
+            if i:
+                pieces.append((False, " "))
+            for j in range(0, len(sentence), TRANSLATION_BATCH_CHARS):
+                pieces.append((True, sentence[j:j + TRANSLATION_BATCH_CHARS]))
+    return pieces
+
+
+def _batches(segments: List[str]) -> List[List[str]]:
+    """Group segments into as few requests as fit TRANSLATION_BATCH_CHARS"""
+    batches, current, size = [], [], 0
+    for segment in segments:
+        if current and size + len(segment) + 1 > TRANSLATION_BATCH_CHARS:
+            batches.append(current)
+            current, size = [], 0
+        current.append(segment)
+        size += len(segment) + 1
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _translate_batch(segments: List[str], source: str, target: str) -> List[Optional[str]]:
+    try:
+        with span("translation_backend"):
+            return get_backend().translate_batch(segments, source, target)
     except Exception as e:
-        logger.warning(f"Translation to English failed: {e}")
+        logger.warning(f"Translation {source}→{target} failed: {e}")
+        return [None] * len(segments)
+
+
+async def translate_texts_checked(texts: List[str], source: str, target: str) -> Tuple[List[str], bool]:
+    """
+    Translate many texts at once: sentences are looked up in the cache, the rest are
+    grouped into backend-sized batches and translated concurrently in the thread pool.
+    Anything that fails to translate is returned unchanged (and not cached); the flag
+    is False if that happened to any sentence.
+    """
+    if source == target or not texts:
+        return list(texts), True
+
+    with span("translation"):
+        pieces = [_split(text) for text in texts]
+        segments = list(dict.fromkeys(piece for split in pieces for translatable, piece in split if translatable))
 
-    return text  # Return original if translation fails
+        cache = get_translation_cache()
+        loop = asyncio.get_running_loop()
+        found = cache.lookup(source, target, segments)
+        missing = [s for s in segments if s not in found]
+        if missing:
+            found.update(await loop.run_in_executor(_executor, cache.load, source, target, missing))
+            missing = [s for s in missing if s not in found]
+        if missing:
+            batches = _batches(missing)
+            results = await asyncio.gather(*(
+                loop.run_in_executor(_executor, _translate_batch, batch, source, target) for batch in batches
+            ))
+            fresh = {s: t for batch, out in zip(batches, results) for s, t in zip(batch, out) if t}
+            if fresh:
+                found.update(fresh)
+                await loop.run_in_executor(_executor, cache.put_many, source, target, fresh)
+
+    translated = ["".join(found.get(piece, piece) if translatable else piece for translatable, piece in split) for split in pieces]
+    return translated, all(s in found for s in segments)
+
+
+async def translate_texts(texts: List[str], source: str, target: str) -> List[str]:
+    """translate_texts_checked() without the flag: failed sentences just stay untranslated"""
+    return (await translate_texts_checked(texts, source, target))[0]
+
+
+async def translate_to_english(text: str, source_lang: str) -> str:
+    """Translate text to English"""
+    return (await translate_to_english_checked(text, source_lang))[0]
 
 
 async def translate_from_english(text: str, target_lang: str) -> str:
     """Translate English response to target language"""
-    if target_lang == "en":
-        return text
+    return (await translate_from_english_checked(text, target_lang))[0]
+
+
+async def translate_to_english_checked(text: str, source_lang: str) -> Tuple[str, bool]:
+    """translate_to_english(), plus whether the whole text was translated"""
+    translated, complete = await translate_texts_checked([text], source_lang, "en")
+    return translated[0], complete
 
-    try:
-        from deep_translator import GoogleTranslator
-        # Split into chunks of 4500 chars (API limit is 5000)
-        chunks = [text[i:i+4500] for i in range(0, len(text), 4500)]
-        translated_chunks = []
-        for chunk in chunks:
-            t = GoogleTranslator(source='en', target=target_lang).translate(chunk)
-            translated_chunks.append(t or chunk)
-        return ' '.join(translated_chunks)
-    except Exception as e:
-        logger.warning(f"Translation from English failed: {e}")
 
-    return text  # Return English if translation fails
+async def translate_from_english_checked(text: str, target_lang: str) -> Tuple[str, bool]:
+    """translate_from_english(), plus whether the whole text was translated"""
+    translated, complete = await translate_texts_checked([text], "en", target_lang)
+    return translated[0], complete
 
 
 def get_language_name(lang_code: str) -> str:
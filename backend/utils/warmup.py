@@ -0,0 +1,91 @@
+"""
+KrishiSahay Warm-up
+Loads the embedding model and indexes on a background thread after the server starts
+accepting connections, so startup doesn't block and /health/ready can gate traffic
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Untimed encodes after loading, so torch's kernels and allocator caches are hot
+WARMUP_ROUNDS = int(os.getenv("WARMUP_ROUNDS", "3"))
+WARMUP_QUERIES = [
+    "How to control aphids on mustard?",
+    "Best fertilizer for wheat in rabi season",
+    "PM-KISAN scheme eligibility and documents",
+    "drip irrigation subsidy",
+]
+
+
+def warm_encoder(rounds: int = WARMUP_ROUNDS):
+    """Encode single queries and a small batch, the two shapes the batching embedder produces"""
+    from utils.embeddings import encode
+    for _ in range(rounds):
+        encode(WARMUP_QUERIES[:1])
+        encode(WARMUP_QUERIES)
+
+
+class Warmup:
+    """Runs named load steps in order on a daemon thread; ready once every step has finished"""
+
+    def __init__(self):
+        self._steps: List[Tuple[str, Callable[[], object]]] = []
+        self._thread: Optional[threading.Thread] = None
+        self.state = "pending"  # pending → warming → ready | failed
+        self.current: Optional[str] = None
+        self.error: Optional[str] = None
+        self.durations_ms: Dict[str, int] = {}
+        self.started_at = time.time()
+
+    def add(self, name: str, fn: Callable[[], object]):
+        self._steps.append((name, fn))
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.state = "warming"
+        self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        for name, fn in self._steps:
+            self.current = name
+            started = time.perf_counter()
+            try:
+                fn()
+            except Exception as e:
+                self.state = "failed"
+                self.error = f"{name}: {e}"
+                logger.error(f"Warm-up step '{name}' failed: {e}")
+                return
+            self.durations_ms[name] = int((time.perf_counter() - started) * 1000)
+        self.current = None
+        self.state = "ready"
+        logger.info(f"✅ Warm-up complete in {sum(self.durations_ms.values())} ms: {self.durations_ms}")
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "step": self.current,
+            "error": self.error,
+            "steps_ms": dict(self.durations_ms),
+            "uptime_s": int(time.time() - self.started_at),
+        }
+
+
+_warmup: Optional[Warmup] = None
+
+def get_warmup() -> Warmup:
+    global _warmup
+    if _warmup is None:
+        _warmup = Warmup()
+    return _warmup